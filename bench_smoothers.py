@@ -0,0 +1,91 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_store import BASE_DIR
+from smoothing import DEFAULT_SMOOTHER, SMOOTHERS
+
+# -----------------------------------------------------
+# 1. SERIES
+# -----------------------------------------------------
+#
+# Every area's monthly series from historical_df.csv (2020+, median_price) and
+# historical_data.csv (2016+, meter_sale_price). --lengths additionally
+# resamples each series to longer synthetic lengths to show how the backends
+# scale as history grows.
+
+def load_series(lengths=()):
+    series = []
+    sources = [("historical_df.csv", "month", "median_price"),
+               ("historical_data.csv", "year_month", "meter_sale_price")]
+    for filename, month_col, price_col in sources:
+        df = pd.read_csv(f"{BASE_DIR}/{filename}")
+        for area, group in df.groupby("area_name_en"):
+            y = group.sort_values(month_col)[price_col].to_numpy(dtype=np.float64)
+            series.append((f"{filename}:{area}", y))
+            for n in lengths:
+                x = np.linspace(0, len(y) - 1, n)
+                series.append((f"{filename}:{area}@{n}", np.interp(x, np.arange(len(y)), y)))
+    return series
+
+
+def _best_time(fn, y, frac, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(y, frac)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+# -----------------------------------------------------
+# 2. Benchmark
+# -----------------------------------------------------
+def run(fracs, lengths, repeat):
+    rows = []
+    for name, y in load_series(lengths):
+        for frac in fracs:
+            ref_time, reference = _best_time(SMOOTHERS[DEFAULT_SMOOTHER], y, frac, repeat)
+            scale = np.abs(reference).mean()
+            for method, fn in SMOOTHERS.items():
+                seconds, out = (ref_time, reference) if method == DEFAULT_SMOOTHER else _best_time(fn, y, frac, repeat)
+                err = out - reference
+                rows.append({
+                    "series": name,
+                    "n": len(y),
+                    "frac": frac,
+                    "method": method,
+                    "ms": seconds * 1e3,
+                    "speedup": ref_time / seconds if seconds else np.inf,
+                    "max_abs_err": float(np.abs(err).max()),
+                    "rel_rmse": float(np.sqrt((err ** 2).mean()) / scale) if scale else 0.0,
+                })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare smoother backends with statsmodels LOWESS on every area's series.")
+    parser.add_argument("--frac", type=float, nargs="+", default=[0.04, 0.1, 0.3])
+    parser.add_argument("--lengths", type=int, nargs="*", default=[], help="also resample each series to these lengths")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write per-series results to this file")
+    args = parser.parse_args()
+
+    # Warm imports so the first series does not pay for them
+    for fn in SMOOTHERS.values():
+        fn(np.arange(10, dtype=np.float64), 0.5)
+
+    results = run(args.frac, args.lengths, args.repeat)
+    summary = results.groupby(["n" if args.lengths else "frac", "method"]).agg(
+        ms=("ms", "median"), speedup=("speedup", "median"),
+        max_abs_err=("max_abs_err", "max"), rel_rmse=("rel_rmse", "median"),
+    )
+    with pd.option_context("display.float_format", "{:.4g}".format, "display.max_rows", 200):
+        print(summary)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results.to_dict(orient="records"), file, indent=1)
@@ -0,0 +1,366 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+#
+# Everything runs against the repo's own 18 area models and CSVs. Results are
+# a flat {metric: value} dict saved as JSON; --baseline compares a run with an
+# earlier file and exits with status 1 when a gated metric regressed by more
+# than --threshold. Metrics ending in rows_per_s are higher-is-better, the
+# rest (milliseconds, megabytes) lower-is-better.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RANGES_PATH = os.path.join(BASE_DIR, "column_input_ranges.csv")
+
+# Options the Streamlit UI offers
+ROOMS = ['1 B/R', 'Studio', '2 B/R', '3 B/R', 'PENTHOUSE', 'More than 3B/R']
+FLOOR_BINS = ['1-10', '11-20', '41-50', '21-30', 'Below 1st floor', '31-40',
+              '51-60', 'Other', '-9-0', '61-70', 'Top floor', '91-100', '81-90',
+              '71-80', 'Duplex']
+FLAGS = ["has_parking", "swimming_pool", "balcony", "elevator", "metro"]
+
+DEFAULT_GATES = ["cold.*", "warm.*", "batch.*", "memory.*", "concurrent.*"]
+HIGHER_IS_BETTER = ("rows_per_s",)
+
+
+def sample_inputs(n, seed=0, areas=None):
+    # Random but reproducible UI-like inputs, procedure_area within each
+    # area's range from column_input_ranges.csv
+    import pandas as pd
+
+    from model_registry import area_key
+
+    ranges = pd.read_csv(RANGES_PATH)
+    if areas is not None:
+        ranges = ranges[ranges["area_name_en"].map(area_key).isin([area_key(area) for area in areas])]
+    if ranges.empty:
+        return []
+    rng = np.random.default_rng(seed)
+    rows = ranges.iloc[rng.integers(0, len(ranges), n)]
+    inputs = []
+    for (_, row), u in zip(rows.iterrows(), rng.random(n)):
+        input_data = {
+            "area_name_en": row["area_name_en"],
+            "procedure_area": float(row["min"] + u * (row["max"] - row["min"])),
+            "rooms_en": ROOMS[rng.integers(len(ROOMS))],
+            "floor_bin": FLOOR_BINS[rng.integers(len(FLOOR_BINS))],
+        }
+        input_data.update({flag: int(rng.integers(2)) for flag in FLAGS})
+        inputs.append(input_data)
+    return inputs
+
+
+def _ms(seconds):
+    return seconds * 1e3
+
+
+def _max_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def _percentiles(prefix, samples_ms):
+    samples = np.asarray(samples_ms)
+    return {f"{prefix}.p50": float(np.percentile(samples, 50)),
+            f"{prefix}.p99": float(np.percentile(samples, 99)),
+            f"{prefix}.mean": float(samples.mean())}
+
+
+# -----------------------------------------------------
+# 2. Cold Start (fresh interpreter per run)
+# -----------------------------------------------------
+def cold_child(input_data, staged):
+    # Runs inside the child process; prints one JSON line. The input comes
+    # from the parent so nothing is imported before the clock starts.
+    out = {}
+    start = time.perf_counter()
+    t = time.perf_counter()
+    from model_testing1 import predict_area, predict_series
+    out["import_ms"] = _ms(time.perf_counter() - t)
+
+    if staged:
+        from data_store import get_data_store
+        from model_registry import get_registry
+        from price_cube import get_price_cube
+        from smoothing import get_smoothing_cache
+
+        for stage, fn in [
+            ("registry_scan", get_registry),
+            ("model_load", lambda: get_registry().get(input_data["area_name_en"])),
+            ("price_cube_load", lambda: get_price_cube(get_registry())),
+            ("csv_parse", get_data_store),
+            ("smooth", lambda: get_smoothing_cache().get(input_data["area_name_en"])),
+            ("predict", lambda: predict_area(input_data)),
+        ]:
+            t = time.perf_counter()
+            fn()
+            out[f"{stage}_ms"] = _ms(time.perf_counter() - t)
+    else:
+        # The pandas-free core (what the HTTP service answers with) first,
+        # then the DataFrame predict_with_area returns
+        predict_series(input_data)
+        out["first_series_ms"] = _ms(time.perf_counter() - start)
+        predict_area(input_data)
+    out["first_prediction_ms"] = _ms(time.perf_counter() - start)
+    out["max_rss_mb"] = _max_rss_mb()
+    print(json.dumps(out))
+
+
+def _spawn(staged, snapshot="0"):
+    # snapshot: PREDICTION_SNAPSHOT for the child, "0" to start from the sources
+    cmd = [sys.executable, os.path.abspath(__file__), "--cold-child", json.dumps(sample_inputs(1, seed=1)[0])]
+    cmd += ["--staged"] if staged else []
+    env = dict(os.environ, PREDICTION_SNAPSHOT=snapshot)
+    result = subprocess.run(cmd, cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_cold(runs):
+    plain = [_spawn(False) for _ in range(runs)]
+    staged = _spawn(True)
+    metrics = _percentiles("cold.first_prediction_ms", [run["first_prediction_ms"] for run in plain])
+    metrics["cold.first_series_ms"] = float(np.median([run["first_series_ms"] for run in plain]))
+    metrics["cold.import_ms"] = float(np.median([run["import_ms"] for run in plain]))
+    metrics["memory.cold_max_rss_mb"] = float(np.median([run["max_rss_mb"] for run in plain]))
+
+    # The same first prediction restored from a snapshot (see snapshot.py)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prediction_state.npz")
+        subprocess.run([sys.executable, os.path.join(BASE_DIR, "snapshot.py"), "--out", path],
+                       cwd=BASE_DIR, env=dict(os.environ, PREDICTION_SNAPSHOT="0"),
+                       capture_output=True, check=True)
+        restored = [_spawn(False, path) for _ in range(runs)]
+    metrics.update(_percentiles("cold.snapshot_first_prediction_ms",
+                                [run["first_prediction_ms"] for run in restored]))
+    metrics["cold.snapshot_first_series_ms"] = float(np.median([run["first_series_ms"] for run in restored]))
+    for name, value in staged.items():
+        if name.endswith("_ms") and name not in ("first_prediction_ms", "import_ms"):
+            metrics[f"stage_cold.{name}"] = value
+    return metrics
+
+
+# -----------------------------------------------------
+# 3. Warm Paths (this process)
+# -----------------------------------------------------
+def bench_warm(n, seed):
+    from model_testing1 import predict_area
+
+    inputs = sample_inputs(n, seed)
+    for input_data in inputs:  # every area loaded and smoothed once
+        predict_area(input_data)
+
+    samples = []
+    for input_data in inputs:
+        t = time.perf_counter()
+        predict_area(input_data)
+        samples.append(_ms(time.perf_counter() - t))
+    return _percentiles("warm.latency_ms", samples)
+
+
+def bench_stages(n, seed):
+    # The stages of predict_area timed one at a time on warm caches
+    import pandas as pd
+
+    from data_store import get_data_store
+    from model_registry import area_key, get_registry
+    from price_cube import get_price_cube
+    from smoothing import get_smoothing_cache
+
+    registry = get_registry()
+    store = get_data_store()
+    cube = get_price_cube(registry)
+    cache = get_smoothing_cache()
+    inputs = sample_inputs(n, seed)
+
+    totals = dict.fromkeys(["registry_get", "encode", "cube_lookup", "tree_predict",
+                            "forecast", "history_smooth", "frame"], 0.0)
+    for input_data in inputs:
+        area = input_data["area_name_en"]
+        t0 = time.perf_counter()
+        entry = registry.get(area)
+        t1 = time.perf_counter()
+        features = np.zeros((1, entry.encoder.n_features))
+        entry.encoder.encode(input_data, out=features[0])
+        t2 = time.perf_counter()
+        if cube is not None:
+            cube.lookup(area_key(area), input_data)
+        t3 = time.perf_counter()
+        price = entry.tree.predict(features)[0]
+        t4 = time.perf_counter()
+        forecast = store.get_forecast(area)
+        forecast_price = price * forecast.growth_factor
+        t5 = time.perf_counter()
+        history = store.get_history(area)
+        smoothed = cache.get(area).copy()
+        t6 = time.perf_counter()
+        pd.DataFrame({"month": np.concatenate([history.month, forecast.month]),
+                      "median_price": np.concatenate([smoothed, forecast_price])})
+        t7 = time.perf_counter()
+        for stage, seconds in zip(totals, np.diff([t0, t1, t2, t3, t4, t5, t6, t7])):
+            totals[stage] += seconds
+    return {f"stage_warm.{stage}_ms": _ms(seconds / n) for stage, seconds in totals.items()}
+
+
+def bench_batch(rows, seed):
+    from model_registry import get_registry
+    from model_testing1 import predict_many
+
+    registry = get_registry()
+    metrics = {}
+    total_rows, total_seconds = 0, 0.0
+    for key in sorted(registry.index):
+        inputs = sample_inputs(rows, seed, areas=[key])
+        if not inputs:
+            continue
+        predict_many(inputs[:10])
+        t = time.perf_counter()
+        predict_many(inputs)
+        seconds = time.perf_counter() - t
+        metrics[f"batch_area.{key}.rows_per_s"] = len(inputs) / seconds
+        total_rows += len(inputs)
+        total_seconds += seconds
+    metrics["batch.rows_per_s"] = total_rows / total_seconds if total_seconds else 0.0
+    return metrics
+
+
+def bench_concurrent(clients, requests, seed):
+    # `clients` concurrent callers on one event loop, each sending its next
+    # request as soon as the last one returned: every request on its own
+    # executor call ("direct") vs grouped per area by MicroBatcher
+    import asyncio
+
+    from micro_batcher import BATCH_WINDOW_MS, MicroBatcher
+    from model_testing1 import predict_series
+
+    inputs = sample_inputs(requests, seed)
+
+    async def drive(call):
+        pending = iter(inputs)
+        samples = []
+
+        async def client():
+            for input_data in pending:
+                t = time.perf_counter()
+                await call(input_data)
+                samples.append(_ms(time.perf_counter() - t))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return samples, time.perf_counter() - start
+
+    async def direct(input_data):
+        return await asyncio.get_running_loop().run_in_executor(None, predict_series, input_data)
+
+    async def run_all():
+        await drive(direct)  # warm every area
+        results = {"direct": await drive(direct)}
+        batcher = MicroBatcher(window_ms=BATCH_WINDOW_MS or 2.0)
+        results["batched"] = await drive(batcher.submit)
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run_all())
+    metrics = {"concurrent_batcher.mean_batch_rows": stats["mean_batch_rows"]}
+    for mode, (samples, seconds) in results.items():
+        metrics.update(_percentiles(f"concurrent.{mode}.latency_ms", samples))
+        metrics[f"concurrent.{mode}.rows_per_s"] = len(samples) / seconds
+    return metrics
+
+
+# -----------------------------------------------------
+# 4. Compare
+# -----------------------------------------------------
+def compare(current, baseline, threshold, gates):
+    # Returns [(metric, old, new, change, regressed)] for every shared metric
+    rows = []
+    for name in sorted(set(current) & set(baseline)):
+        old, new = baseline[name], current[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        gated = any(fnmatch.fnmatch(name, pattern) for pattern in gates)
+        rows.append((name, old, new, change, gated and worse > threshold))
+    return rows
+
+
+def run(args):
+    metrics = {}
+    start = time.perf_counter()
+    if not args.skip_cold:
+        metrics.update(bench_cold(args.cold_runs))
+    metrics.update(bench_warm(args.n, args.seed))
+    metrics.update(bench_stages(args.n, args.seed))
+    metrics.update(bench_batch(args.batch_rows, args.seed))
+    metrics.update(bench_concurrent(args.clients, args.concurrent_requests, args.seed))
+    metrics["memory.max_rss_mb"] = _max_rss_mb()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "n": args.n,
+            "batch_rows": args.batch_rows,
+            "clients": args.clients,
+            "cold_runs": 0 if args.skip_cold else args.cold_runs,
+            "seed": args.seed,
+            "seconds": time.perf_counter() - start,
+        },
+        "metrics": metrics,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark predict_with_area and the batch path on the bundled models.")
+    parser.add_argument("--n", type=int, default=500, help="single predictions for the warm latency")
+    parser.add_argument("--batch-rows", type=int, default=2000, help="rows per area for batch throughput")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent callers for the micro-batching run")
+    parser.add_argument("--concurrent-requests", type=int, default=5000)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--skip-cold", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative regression that fails the run (default 0.25 = 25%%)")
+    parser.add_argument("--gate", nargs="*", default=DEFAULT_GATES, help="metric patterns that can fail the run")
+    parser.add_argument("--cold-child", help=argparse.SUPPRESS)
+    parser.add_argument("--staged", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_child:
+        cold_child(json.loads(args.cold_child), args.staged)
+        sys.exit(0)
+
+    results = run(args)
+    for name, value in sorted(results["metrics"].items()):
+        print(f"{name:<45} {value:12.3f}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["metrics"]
+        rows = compare(results["metrics"], baseline, args.threshold, args.gate)
+        print()
+        for name, old, new, change, regressed in rows:
+            print(f"{'❌' if regressed else '  '} {name:<45} {old:12.3f} -> {new:12.3f} ({change:+.1%})")
+        failed = [row for row in rows if row[4]]
+        if failed:
+            print(f"❌ {len(failed)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"✅ No gated metric regressed by more than {args.threshold:.0%}")
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_bundle import BUNDLE_PATH, build_bundle
+from price_cube import floor_float32
+from tree_engine import LEAF, FlatTree, _parity_inputs
+
+# -----------------------------------------------------
+# 1. FORMAT
+# -----------------------------------------------------
+#
+# A compact tree is a FlatTree with the same five arrays, smaller:
+#   - identical subtrees are stored once (the tree becomes a DAG), and a split
+#     whose two sides are the same subtree is replaced by that subtree, so
+#     leaves predicting the same value collapse into one node
+#   - thresholds are float32, rounded down: inputs are compared as float32,
+#     and x <= t holds for a float32 x exactly when x <= floor32(t)
+#   - values are float32 (the only lossy step, ~1e-7 relative)
+#   - feature and child ids are int16, or int32 when the tree needs it
+# Nodes are renumbered depth-first from the root, so node 0 is still the root.
+
+LEAF_FEATURE = -2  # what sklearn stores for leaves
+
+
+def _index_dtype(n):
+    return np.int16 if n <= np.iinfo(np.int16).max else np.int32
+
+
+# -----------------------------------------------------
+# 2. Compaction
+# -----------------------------------------------------
+def compact(tree):
+    feature = np.asarray(tree.feature)
+    threshold = floor_float32(tree.threshold)
+    left = np.asarray(tree.left)
+    right = np.asarray(tree.right)
+    value = np.asarray(tree.value, dtype=np.float32)
+
+    # sklearn numbers children after their parent, so walking the ids
+    # backwards visits both children of a node before the node itself
+    canonical = np.empty(len(left), dtype=np.int64)
+    nodes, seen = [], {}
+    for i in range(len(left) - 1, -1, -1):
+        if left[i] == LEAF:
+            signature = (LEAF, value[i].item())
+        else:
+            l, r = canonical[left[i]], canonical[right[i]]
+            if l == r:
+                canonical[i] = l
+                continue
+            signature = (int(feature[i]), threshold[i].item(), int(l), int(r))
+        if signature not in seen:
+            seen[signature] = len(nodes)
+            nodes.append(signature)
+        canonical[i] = seen[signature]
+
+    # Renumber depth-first from the root; shared subtrees keep one id
+    order, new_id = [], {}
+    stack = [int(canonical[0])]
+    while stack:
+        node = stack.pop()
+        if node in new_id:
+            continue
+        new_id[node] = len(order)
+        order.append(node)
+        if nodes[node][0] != LEAF:
+            stack.append(nodes[node][3])
+            stack.append(nodes[node][2])
+
+    n = len(order)
+    index_dtype = _index_dtype(n)
+    out = FlatTree(
+        feature=np.full(n, LEAF_FEATURE, dtype=_index_dtype(int(feature.max(initial=0)))),
+        threshold=np.full(n, LEAF_FEATURE, dtype=np.float32),
+        left=np.full(n, LEAF, dtype=index_dtype),
+        right=np.full(n, LEAF, dtype=index_dtype),
+        value=np.zeros(n, dtype=np.float32),
+    )
+    for i, node in enumerate(order):
+        signature = nodes[node]
+        if signature[0] == LEAF:
+            out.value[i] = signature[1]
+        else:
+            out.feature[i], out.threshold[i] = signature[0], signature[1]
+            out.left[i], out.right[i] = new_id[signature[2]], new_id[signature[3]]
+    return out
+
+
+def compact_tree(area, tree):
+    # build_bundle transform; the name is recorded in the bundle header
+    return compact(tree)
+
+
+# -----------------------------------------------------
+# 3. Size + Accuracy Report
+# -----------------------------------------------------
+def holdout_rows(df, manifest=None):
+    """The rows train_models.py held out for validation, per area key.
+
+    Returns {key: (X, y, column names, partition digest matches)}. The last
+    item is False when the manifest shows the area was trained on other
+    data, so the rows may have been in its training set.
+    """
+    from train_models import partition_sha256, prepare, validation_split
+
+    X, y, columns, partitions = prepare(df)
+    trained = (manifest or {}).get("areas", {})
+    holdout = {}
+    for key, (_, start, stop, used) in partitions.items():
+        val, _ = validation_split(stop - start)
+        if not len(val):
+            continue
+        digest = trained.get(key, {}).get("partition_sha256")
+        matches = digest is None or digest == partition_sha256(X, y, columns, start, stop, used)
+        holdout[key] = (X[start:stop][val][:, used], y[start:stop][val], [columns[i] for i in used], matches)
+    return holdout
+
+
+def _align(X, columns, encoder):
+    # Data columns into the model's layout by name, as serving encodes them
+    out = np.zeros((len(X), encoder.n_features))
+    position = {col: i for i, col in enumerate(encoder.columns)}
+    for j, col in enumerate(columns):
+        i = position.get(col)
+        if i is not None:
+            out[:, i] = X[:, j]
+    return out
+
+
+def compare_area(entry, holdout=None):
+    """Size and prediction deltas of one area's compacted tree.
+
+    Predictions of both trees are compared on the tree_engine parity inputs
+    (every category and split point). With the area's held-out training rows
+    the validation MAE / MAPE of both trees is reported as well.
+    """
+    original = entry.tree
+    compacted = compact(original)
+    X = _parity_inputs(entry.encoder, original)
+    before = original.predict(X)
+    after = compacted.predict(X)
+
+    report = {
+        "area": entry.area,
+        "pickle_bytes": os.path.getsize(entry.model_path) if entry.model_path else None,
+        "nodes": original.node_count,
+        "compact_nodes": compacted.node_count,
+        "bytes": original.nbytes,
+        "compact_bytes": compacted.nbytes,
+        "rows": len(X),
+        "max_abs_change": float(np.abs(after - before).max()),
+        "rows_changed": int((after != before).sum()),
+    }
+    if holdout is not None:
+        X_val, y_val, columns, matches = holdout
+        X_val = _align(X_val, columns, entry.encoder)
+        for prefix, tree in (("", original), ("compact_", compacted)):
+            error = tree.predict(X_val) - y_val
+            report[f"{prefix}val_mae"] = float(np.abs(error).mean())
+            report[f"{prefix}val_mape"] = float(np.abs(error / y_val).mean())
+        report["val_rows"] = len(y_val)
+        report["val_is_holdout"] = matches
+    return report
+
+
+def compare_all(registry, holdout=None, log=print):
+    reports = []
+    for key in sorted(registry.index):
+        entry = registry.get(key)
+        report = compare_area(entry, (holdout or {}).get(key))
+        reports.append(report)
+        accuracy = ""
+        if "val_mae" in report:
+            accuracy = (f", val MAE {report['val_mae']:.2f} -> {report['compact_val_mae']:.2f}, "
+                        f"MAPE {report['val_mape']:.4%} -> {report['compact_val_mape']:.4%}")
+            if not report["val_is_holdout"]:
+                accuracy += " (⚠️ trained on other data, rows may not be held out)"
+        log(f"✅ {report['area']}: {report['nodes']} -> {report['compact_nodes']} nodes, "
+            f"{report['bytes'] / 1e3:.1f} -> {report['compact_bytes'] / 1e3:.1f} kB, "
+            f"max change {report['max_abs_change']:.4f} on {report['rows']} rows{accuracy}")
+    return reports
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    from model_registry import ModelRegistry
+    from train_models import TRAINING_PATH, load_manifest
+
+    parser = argparse.ArgumentParser(description="Compact the per-area trees into the model bundle and report "
+                                                 "the size and accuracy deltas.")
+    parser.add_argument("--bundle", default=BUNDLE_PATH)
+    parser.add_argument("--data", default=TRAINING_PATH, help="training transactions, for the validation error")
+    parser.add_argument("--report", help="also write the per-area report as JSON")
+    parser.add_argument("--dry-run", action="store_true", help="only report, keep the current bundle")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    holdout = None
+    if os.path.exists(args.data):
+        data = pd.read_parquet(args.data) if args.data.endswith(".parquet") else pd.read_csv(args.data)
+        holdout = holdout_rows(data, load_manifest())
+    else:
+        print(f"⚠️ No training data at {args.data}: reporting prediction changes only")
+
+    registry = ModelRegistry(bundle_path=None, compiled_dir=None)
+    reports = compare_all(registry, holdout)
+    total = {name: sum(r[name] for r in reports) for name in ("pickle_bytes", "bytes", "compact_bytes")}
+    print(f"{len(reports)} areas: pickles {total['pickle_bytes'] / 1e6:.2f} MB, trees "
+          f"{total['bytes'] / 1e6:.2f} MB -> {total['compact_bytes'] / 1e6:.2f} MB, "
+          f"largest change {max((r['max_abs_change'] for r in reports), default=0.0):.4f}")
+    if args.report:
+        with open(f"{args.report}.tmp", "w") as file:
+            json.dump(reports, file, indent=1)
+        os.replace(f"{args.report}.tmp", args.report)
+    if args.dry_run:
+        sys.exit(0)
+
+    header = build_bundle(registry.index, args.bundle, transform=compact_tree)
+    print(f"✅ Compact bundle {args.bundle}: {header['payload_bytes'] / 1e6:.2f} MB")
+    if args.bundle == BUNDLE_PATH:
+        # The served version changed, so the price cube is rebuilt from the compact trees
+        from price_cube import build_price_cube
+
+        build_price_cube(ModelRegistry()).save()
+        print("✅ Rebuilt the price cube; rebuild the snapshot with snapshot.py if one is deployed")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,246 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import timed
+from model_registry import area_key
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FORECAST_PATH = os.path.join(BASE_DIR, "Sarima_forecast_6M.csv")
+HISTORY_PATH = os.path.join(BASE_DIR, "historical_df.csv")
+STORE_DIR = os.path.join(BASE_DIR, "monthly_store")
+
+FORECAST_COLUMNS = ["yhat", "yhat_lower", "yhat_upper",
+                    "growth_factor", "growth_factor_lower", "growth_factor_upper"]
+# Rows of AreaForecast.factors: lower, point and upper price paths
+BAND_COLUMNS = ["growth_factor_lower", "growth_factor", "growth_factor_upper"]
+
+
+# -----------------------------------------------------
+# 2. Per-Area Arrays
+# -----------------------------------------------------
+class AreaForecast:
+    __slots__ = ("area", "source_sha256", "month", "factors") + tuple(FORECAST_COLUMNS)
+
+    def __init__(self, area, frame, source_sha256=None):
+        self.area = area
+        self.source_sha256 = source_sha256
+        frame = frame.sort_values("month", kind="stable")
+        self.month = frame["month"].to_numpy(dtype=object)
+        for col in FORECAST_COLUMNS:
+            setattr(self, col, frame[col].to_numpy(dtype=np.float64))
+        self._stack_factors()
+
+    def _stack_factors(self):
+        # (3, months): base price * factors gives all three paths in one multiply
+        self.factors = np.vstack([getattr(self, col) for col in BAND_COLUMNS])
+        self.factors.flags.writeable = False
+
+    @classmethod
+    def from_arrays(cls, area, month, source_sha256=None, **columns):
+        self = cls.__new__(cls)
+        self.area = area
+        self.source_sha256 = source_sha256
+        self.month = month
+        for col in FORECAST_COLUMNS:
+            setattr(self, col, columns[col])
+        self._stack_factors()
+        return self
+
+    def __len__(self):
+        return len(self.month)
+
+
+class AreaHistory:
+    __slots__ = ("area", "source_sha256", "month", "median_price")
+
+    def __init__(self, area, frame, source_sha256=None):
+        self.area = area
+        self.source_sha256 = source_sha256
+        frame = frame.sort_values("month", kind="stable")
+        self.month = frame["month"].to_numpy(dtype=object)
+        self.median_price = frame["median_price"].to_numpy(dtype=np.float64)
+
+    @classmethod
+    def from_arrays(cls, area, month, source_sha256=None, median_price=None):
+        self = cls.__new__(cls)
+        self.area = area
+        self.source_sha256 = source_sha256
+        self.month = month
+        self.median_price = median_price
+        return self
+
+    def __len__(self):
+        return len(self.month)
+
+
+def _split_by_area(df, cls, source_sha256=None):
+    return {
+        area_key(area): cls(area, group, source_sha256)
+        for area, group in df.groupby("area_name_en", sort=False)
+    }
+
+
+def history_sha256(frame):
+    # Content hash of one area's history, so caches keyed on it survive
+    # updates to other areas
+    frame = frame.sort_values("month", kind="stable")
+    digest = hashlib.sha256("\n".join(frame["month"].astype(str)).encode())
+    digest.update(frame["median_price"].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# -----------------------------------------------------
+# 3. Store
+# -----------------------------------------------------
+class DataStore:
+    """Forecast and history tables parsed once and split by area.
+
+    File modification times are re-checked at most every ``check_interval``
+    seconds; a changed file (e.g. a fresh SARIMA run) is reloaded in place.
+    With a ``history_store`` (see monthly_store.py) history comes from the
+    incrementally updated monthly medians instead of historical_df.csv; with
+    a ``store_dir`` the store is picked up at the first refresh after it has
+    been seeded there, without a restart.
+    With a ``snapshot`` (see snapshot.py) a file whose SHA-256 matches the
+    snapshot's is restored from it instead of being parsed.
+    """
+
+    def __init__(self, forecast_path=FORECAST_PATH, history_path=HISTORY_PATH, check_interval=1.0,
+                 history_store=None, snapshot=None, store_dir=None):
+        self.forecast_path = forecast_path
+        self.history_path = history_path
+        self.history_store = history_store
+        self.store_dir = store_dir
+        self.snapshot = snapshot
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtimes = (None, None)
+        self.forecast = {}
+        self.history = {}
+        self.forecast_sha256 = None
+        self.history_sha256 = None
+        self.reloads = 0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+
+        with self._lock:
+            self._checked_at = now
+            self._attach_store()
+            mtimes = (_mtime(self.forecast_path), self._history_mtime())
+            if not force and mtimes == self._mtimes:
+                return False
+
+            if force or mtimes[0] != self._mtimes[0]:
+                self.forecast, self.forecast_sha256 = self._read(self.forecast_path, AreaForecast)
+            if force or mtimes[1] != self._mtimes[1]:
+                self.history, self.history_sha256 = self._read_history()
+            self._mtimes = mtimes
+            self.reloads += 1
+            return True
+
+    def update_history(self, frame, source_sha256=None):
+        # Called by an ingest in this process: only the areas in `frame` are
+        # replaced, the rest (and their smoothed series) stay as they are.
+        with self._lock:
+            history = dict(self.history)
+            for area, group in frame.groupby("area_name_en", sort=False):
+                history[area_key(area)] = AreaHistory(area, group, history_sha256(group))
+            self.history = history
+            self.history_sha256 = source_sha256
+            self._mtimes = (self._mtimes[0], self._history_mtime())
+
+    def get_forecast(self, area_name_en):
+        self.refresh()
+        return self.forecast.get(area_key(area_name_en))
+
+    def get_history(self, area_name_en):
+        self.refresh()
+        return self.history.get(area_key(area_name_en))
+
+    def _attach_store(self):
+        # MonthlyStore.exists(): seeded once its VERSION file is written. The
+        # changed history mtime then reloads history from the store.
+        if self.history_store is None and self.store_dir is not None \
+                and os.path.exists(os.path.join(self.store_dir, "VERSION")):
+            from monthly_store import MonthlyStore
+
+            self.history_store = MonthlyStore(self.store_dir)
+
+    def _history_mtime(self):
+        if self.history_store is not None:
+            return _mtime(self.history_store.version_path)
+        return _mtime(self.history_path)
+
+    @timed("history_load")
+    def _read_history(self):
+        if self.history_store is None:
+            return self._read(self.history_path, AreaHistory)
+        version = self.history_store.version()
+        restored = self.snapshot.areas(AreaHistory, version) if self.snapshot is not None else None
+        if restored is not None:
+            return restored, version
+        frame = self.history_store.history_frame()
+        history = {
+            area_key(area): AreaHistory(area, group, history_sha256(group))
+            for area, group in frame.groupby("area_name_en", sort=False)
+        }
+        return history, self.history_store.version()
+
+    @timed("csv_parse")
+    def _read(self, path, cls):
+        # Returns the per-area split plus a content hash of the file, which
+        # downstream caches (e.g. smoothed history) key on.
+        if not os.path.exists(path):
+            return {}, None
+        with open(path, "rb") as file:
+            raw = file.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        restored = self.snapshot.areas(cls, digest) if self.snapshot is not None else None
+        if restored is not None:
+            return restored, digest
+
+        import pandas as pd
+
+        return _split_by_area(pd.read_csv(io.BytesIO(raw)), cls, digest), digest
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_data_store():
+    # History is read from the monthly store once it has been seeded, also
+    # when that happens after the process started
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from snapshot import get_snapshot
+
+                _store = DataStore(store_dir=STORE_DIR, snapshot=get_snapshot())
+    return _store
@@ -0,0 +1,131 @@
+import numpy as np
+
+# -----------------------------------------------------
+# 1. INPUT SCHEMA
+# -----------------------------------------------------
+
+# String inputs that pd.get_dummies expanded into "<field>_<value>" columns
+CATEGORICAL_FIELDS = ("area_name_en", "floor_bin", "rooms_en")
+
+# The area is implied by the model itself, so it is never reported as unknown
+SILENT_FIELDS = ("area_name_en",)
+
+
+
+def _missing(value):
+    # None, or the NaN pandas puts in a column for a row without the field
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _category_column(index, value):
+    try:
+        return index.get(value, -1)
+    except TypeError:
+        # Unhashable (a list or dict) can never be a trained category
+        return -1
+
+
+# -----------------------------------------------------
+# 2. Encoder
+# -----------------------------------------------------
+class AreaEncoder:
+    """Maps raw inputs straight to the column layout of one area's model.
+
+    Built once from a ``trained_columns_*.pkl`` list. Produces the same
+    matrix as ``pd.get_dummies`` + zero padding + reindex, but writes into a
+    preallocated float array and reports categories the model never saw
+    instead of silently zero-filling them. A missing numeric input (absent,
+    None or NaN) is encoded as 0 and reported with value None.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.n_features = len(self.columns)
+        self.numeric = {}
+        self.categories = {field: {} for field in CATEGORICAL_FIELDS}
+
+        for i, col in enumerate(self.columns):
+            for field in CATEGORICAL_FIELDS:
+                if col.startswith(field + "_"):
+                    self.categories[field][col[len(field) + 1:]] = i
+                    break
+            else:
+                self.numeric[col] = i
+
+        self._numeric_items = tuple(self.numeric.items())
+        self._category_items = tuple((f, idx) for f, idx in self.categories.items())
+
+    def encode(self, input_data, out=None):
+        # Encode one input dict into `out` (length n_features); returns the
+        # list of (field, value) pairs that had no matching column.
+        if out is None:
+            out = np.zeros(self.n_features)
+        else:
+            out[:] = 0.0
+
+        unknown = []
+        for field, i in self._numeric_items:
+            value = input_data.get(field)
+            if _missing(value):
+                unknown.append((field, None))
+                continue
+            try:
+                out[i] = value
+            except (TypeError, ValueError):
+                unknown.append((field, value))
+
+        for field, index in self._category_items:
+            value = input_data.get(field)
+            if _missing(value):
+                continue
+            i = _category_column(index, value)
+            if i >= 0:
+                out[i] = 1.0
+            elif field not in SILENT_FIELDS:
+                unknown.append((field, value))
+
+        return unknown
+
+    def encode_columns(self, data, n_rows, out=None):
+        # Column-wise batch encoding. `data` maps field -> sequence of length
+        # n_rows. Returns (matrix, [(row, field, value), ...] unknowns).
+        if out is None:
+            out = np.zeros((n_rows, self.n_features))
+        else:
+            out[:] = 0.0
+
+        unknown = []
+        for field, i in self._numeric_items:
+            values = data.get(field, [None] * n_rows)
+            try:
+                column = np.asarray(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                column = np.full(n_rows, np.nan)
+                for row, value in enumerate(values):
+                    if _missing(value):
+                        continue
+                    try:
+                        column[row] = value
+                    except (TypeError, ValueError):
+                        column[row] = 0.0
+                        unknown.append((row, field, value))
+            # Same default as encode, so a row prices the same alone or in a batch
+            missing = np.flatnonzero(np.isnan(column))
+            column[missing] = 0.0
+            out[:, i] = column
+            unknown.extend((int(row), field, None) for row in missing)
+
+        for field, index in self._category_items:
+            if field not in data:
+                continue
+            values = data[field]
+            cols = np.fromiter((_category_column(index, v) for v in values), dtype=np.int64, count=n_rows)
+            hit = cols >= 0
+            out[np.flatnonzero(hit), cols[hit]] = 1.0
+            if field not in SILENT_FIELDS:
+                for row in np.flatnonzero(~hit):
+                    value = values[row]
+                    if not _missing(value):
+                        unknown.append((int(row), field, value))
+
+        return out, unknown
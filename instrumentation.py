@@ -0,0 +1,236 @@
+import atexit
+import bisect
+import collections
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+#
+# PREDICTION_METRICS=0     turns the stage histograms off
+# PREDICTION_SLOW_MS=<ms>  logs one JSON line per prediction slower than this
+# PREDICTION_PROFILE=<path> samples every thread's stack while the process
+#                          runs and writes collapsed stacks (flamegraph.pl /
+#                          speedscope input) to <path> at exit
+
+ENABLED = os.environ.get("PREDICTION_METRICS", "1") != "0"
+SLOW_MS = float(os.environ["PREDICTION_SLOW_MS"]) if os.environ.get("PREDICTION_SLOW_MS") else None
+
+# Histogram bucket upper bounds in seconds, 10us to 5s
+BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0)
+
+logger = logging.getLogger("prediction.metrics")
+
+
+# -----------------------------------------------------
+# 2. Stage Metrics
+# -----------------------------------------------------
+class _Stage:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self, n_buckets):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (n_buckets + 1)
+
+
+class StageMetrics:
+    """Count, sum, max and a fixed-bucket histogram of seconds per stage.
+
+    One lock and a bisect per observation, so spans can stay on under load.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = _Stage(len(self.buckets))
+            stage.count += 1
+            stage.total += seconds
+            if seconds > stage.max:
+                stage.max = seconds
+            stage.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": stage.count,
+                    "sum_s": stage.total,
+                    "max_s": stage.max,
+                    "mean_ms": stage.total / stage.count * 1e3 if stage.count else 0.0,
+                }
+                for name, stage in sorted(self._stages.items())
+            }
+
+    def prometheus(self, metric="prediction_stage_seconds"):
+        # Prometheus text exposition format, one histogram labelled by stage
+        lines = [f"# HELP {metric} Time spent per prediction stage.", f"# TYPE {metric} histogram"]
+        with self._lock:
+            stages = sorted((name, stage.count, stage.total, list(stage.buckets))
+                            for name, stage in self._stages.items())
+        for name, count, total, buckets in stages:
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total:.9f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
+_trace = contextvars.ContextVar("prediction_trace", default=None)
+
+
+# -----------------------------------------------------
+# 3. Spans
+# -----------------------------------------------------
+class span:
+    """``with span("encode"): ...`` times one stage into the shared metrics
+    and, inside a ``trace``, into that request's stage list."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if ENABLED:
+            metrics.observe(self.name, elapsed)
+        stages = _trace.get()
+        if stages is not None:
+            stages.append((self.name, elapsed))
+        return False
+
+
+class trace(span):
+    """A span that also collects the spans nested in it (per thread / task)
+    and logs them as one JSON line when the whole took PREDICTION_SLOW_MS
+    or more."""
+
+    __slots__ = ("stages", "token")
+
+    def __enter__(self):
+        self.stages = []
+        self.token = _trace.set(self.stages)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        # Reset first so the trace is recorded in an enclosing trace, not its own
+        _trace.reset(self.token)
+        super().__exit__(*exc)
+        elapsed_ms = (time.perf_counter() - self.start) * 1e3
+        if SLOW_MS is not None and elapsed_ms >= SLOW_MS:
+            stages = collections.defaultdict(float)
+            for name, seconds in self.stages:
+                stages[name] += seconds * 1e3
+            logger.warning(json.dumps({"event": self.name, "ms": round(elapsed_ms, 3),
+                                       "stages": {name: round(ms, 3) for name, ms in stages.items()}}))
+        return False
+
+
+def timed(name, kind=span):
+    # Decorator form of span (or trace), for loaders and entry points
+    def decorate(fn):
+        def wrapper(*args, **kwargs):
+            with kind(name):
+                return fn(*args, **kwargs)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    return decorate
+
+
+def log_snapshot():
+    # The JSON alternative to scraping /metrics: one line with every stage
+    logger.info(json.dumps({"event": "stage_metrics", "stages": metrics.snapshot()}))
+
+
+# -----------------------------------------------------
+# 4. Sampling Profiler
+# -----------------------------------------------------
+class SamplingProfiler:
+    """Samples the Python stacks of other threads every ``interval`` seconds.
+
+    Runs in a daemon thread and only reads ``sys._current_frames()``, so the
+    profiled code is not slowed down beyond the GIL hand-offs. ``collapsed()``
+    returns "frame;frame;frame count" lines for flame graph tools.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def write(self, path):
+        with open(path, "w") as file:
+            file.write(self.collapsed())
+
+
+_profiler = None
+
+
+def start_profiler_from_env():
+    global _profiler
+    path = os.environ.get("PREDICTION_PROFILE")
+    if path and _profiler is None:
+        _profiler = SamplingProfiler().start()
+        atexit.register(lambda: _profiler.stop().write(path))
+    return _profiler
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+
+from instrumentation import ENABLED, metrics
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+#
+# PREDICTION_BATCH_WINDOW_MS  how long a request waits for others while a batch
+#                             is in flight (default 2, 0 turns batching off)
+# PREDICTION_BATCH_MAX_ROWS   a batch this large is sent without waiting
+# PREDICTION_MAX_PENDING      requests queued or in flight before new ones are
+#                             turned away with Overloaded
+
+BATCH_WINDOW_MS = float(os.environ.get("PREDICTION_BATCH_WINDOW_MS", "2"))
+BATCH_MAX_ROWS = int(os.environ.get("PREDICTION_BATCH_MAX_ROWS", "256"))
+MAX_PENDING = int(os.environ.get("PREDICTION_MAX_PENDING", "2048"))
+
+
+class Overloaded(RuntimeError):
+    pass
+
+
+# -----------------------------------------------------
+# 2. Batcher
+# -----------------------------------------------------
+class MicroBatcher:
+    """Groups concurrent single predictions into one batch call.
+
+    ``await submit(input_data)`` queues the input. When no batch is running
+    the queue is sent on the next event loop turn, so a lone request waits
+    for nothing; while one is running, requests collect until it finishes,
+    ``window_ms`` passes or ``max_rows`` are queued. Each batch is one
+    ``predict(inputs)`` executor call, which groups the rows by area (see
+    predict_series_many) and returns one result per input, in order; each
+    caller gets its own back. When the batch call raises, the batch is retried
+    one input at a time, so only the callers whose input fails get the error.
+
+    At most ``max_pending`` requests are queued or in flight; beyond that
+    ``submit`` raises Overloaded straight away instead of growing the queue.
+    Time spent queued is recorded as the "queue_wait" stage.
+    """
+
+    def __init__(self, predict=None, window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS,
+                 max_pending=MAX_PENDING, executor=None):
+        if predict is None:
+            from model_testing1 import predict_series_many as predict
+        self.predict = predict
+        self.window = window_ms / 1e3
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.executor = executor
+
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.in_flight = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.retried = 0
+
+    async def submit(self, input_data):
+        if self.depth >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(f"❌ {self.depth} predictions pending, try again shortly")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((input_data, future, time.perf_counter()))
+        self.submitted += 1
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif len(self._pending) == 1:
+            if self.in_flight:
+                self._timer = loop.call_later(self.window, self._flush)
+            else:
+                self._timer = loop.call_soon(self._flush)
+        try:
+            return await future
+        finally:
+            self.depth -= 1
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        now = time.perf_counter()
+        if ENABLED:
+            for _, _, queued in batch:
+                metrics.observe("queue_wait", now - queued)
+        self.batches += 1
+        self.batched_rows += len(batch)
+        self.in_flight += 1
+
+        try:
+            results = await self._predict([item[0] for item in batch])
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight and self._pending:
+                self._flush()
+        for (_, future, _), (error, result) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _predict(self, inputs):
+        # [(exception or None, result)] per input
+        loop = asyncio.get_running_loop()
+        try:
+            return [(None, result) for result in await loop.run_in_executor(self.executor, self.predict, inputs)]
+        except Exception as e:
+            if len(inputs) == 1:
+                return [(e, None)]
+        self.retried += 1
+        results = []
+        for input_data in inputs:
+            results += await self._predict([input_data])
+        return results
+
+    async def drain(self):
+        # Sends whatever is still queued and waits for every batch in flight
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "queued": len(self._pending),
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_rows": self.batched_rows / self.batches if self.batches else 0.0,
+            "retried": self.retried,
+            "window_ms": self.window * 1e3,
+            "max_rows": self.max_rows,
+            "max_pending": self.max_pending,
+        }
+
+    def prometheus(self, prefix="prediction_batcher"):
+        lines = [
+            f"# TYPE {prefix}_queue_depth gauge",
+            f"{prefix}_queue_depth {self.depth}",
+            f"# TYPE {prefix}_queue_depth_max gauge",
+            f"{prefix}_queue_depth_max {self.max_depth}",
+        ]
+        for name, value in [("submitted", self.submitted), ("rejected", self.rejected),
+                            ("batches", self.batches), ("batched_rows", self.batched_rows),
+                            ("retried", self.retried)]:
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        return "\n".join(lines) + "\n"
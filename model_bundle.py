@@ -0,0 +1,244 @@
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+import numpy as np
+
+from tree_engine import ARRAYS, FlatTree
+
+# -----------------------------------------------------
+# 1. FORMAT
+# -----------------------------------------------------
+#
+#   MAGIC (8 bytes) | format version (uint32) | header length (uint32)
+#   header JSON, padded to ALIGN
+#   payload: every area's tree arrays, each starting on an ALIGN boundary
+#
+# The header carries the area index, column lists, array offsets/dtypes, the
+# fingerprint of the pickles the bundle was built from, the name of the
+# transform applied to the trees (if any) and a SHA-256 of the payload.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_PATH = os.path.join(BASE_DIR, "dt_models.bundle")
+
+MAGIC = b"DTBUNDL\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGN = 64
+
+
+class BundleError(Exception):
+    pass
+
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_line(key, model_sha256, columns_sha256):
+    return f"{key}:{model_sha256}:{columns_sha256}"
+
+
+def source_digest(index):
+    # Identifies a consistent set of (model, columns) pickles; doubles as the model version
+    lines = [_source_line(key, _sha256(index[key][1]), _sha256(index[key][2])) for key in sorted(index)]
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# -----------------------------------------------------
+# 2. Build
+# -----------------------------------------------------
+def build_bundle(index, path=BUNDLE_PATH, transform=None):
+    # index: {key: (area, model_path, columns_path)} as in ModelRegistry.index.
+    # transform optionally rewrites each FlatTree before it is stored; its
+    # __name__ is recorded and changes the model version.
+    areas = {}
+    payload = []
+    offset = 0
+    sources = []
+
+    for key in sorted(index):
+        area, model_path, columns_path = index[key]
+        with open(model_path, "rb") as file:
+            tree = FlatTree.from_sklearn(pickle.load(file))
+        with open(columns_path, "rb") as file:
+            columns = list(pickle.load(file))
+        if transform is not None:
+            tree = transform(area, tree)
+
+        arrays = {}
+        for name in ARRAYS:
+            data = np.ascontiguousarray(getattr(tree, name))
+            arrays[name] = {"offset": offset, "dtype": data.dtype.str, "shape": list(data.shape)}
+            raw = data.tobytes()
+            payload.append(raw + b"\0" * _pad(len(raw)))
+            offset += len(raw) + _pad(len(raw))
+
+        source = {
+            "model_sha256": _sha256(model_path),
+            "columns_sha256": _sha256(columns_path),
+            "model_stamp": file_stamp(model_path),
+            "columns_stamp": file_stamp(columns_path),
+        }
+        sources.append(_source_line(key, source["model_sha256"], source["columns_sha256"]))
+        areas[key] = {"area": area, "columns": columns, "source": source, "arrays": arrays}
+
+    payload = b"".join(payload)
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "source_digest": hashlib.sha256("\n".join(sources).encode()).hexdigest(),
+        "transform": transform.__name__ if transform is not None else None,
+        "payload_sha256": hashlib.sha256(payload).hexdigest(),
+        "payload_bytes": len(payload),
+        "areas": areas,
+    }
+    raw_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    raw_header += b" " * _pad(PREAMBLE.size + len(raw_header))
+
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(raw_header)))
+        file.write(raw_header)
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+# -----------------------------------------------------
+# 3. Read
+# -----------------------------------------------------
+class ModelBundle:
+    """Read-only, memory-mapped view of a model bundle.
+
+    Opening parses only the preamble and JSON header; tree arrays are
+    zero-copy views into the shared mapping, so every worker process that
+    opens the same file shares the same physical pages.
+    """
+
+    def __init__(self, path=BUNDLE_PATH, verify=False):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise BundleError(f"❌ Empty model bundle: {path}")
+
+        magic, version, header_len = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise BundleError(f"❌ Not a model bundle: {path}")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise BundleError(f"❌ Unsupported bundle format {version} (expected {FORMAT_VERSION}): {path}")
+
+        self.header = json.loads(bytes(self._mmap[PREAMBLE.size:PREAMBLE.size + header_len]))
+        self.areas = self.header["areas"]
+        self._payload_start = PREAMBLE.size + header_len
+        if len(self._mmap) - self._payload_start != self.header["payload_bytes"]:
+            self.close()
+            raise BundleError(f"❌ Truncated model bundle: {path}")
+
+        if verify and not self.verify():
+            self.close()
+            raise BundleError(f"❌ Model bundle checksum mismatch: {path}")
+
+    @property
+    def model_version(self):
+        # Trees rewritten by a transform predict differently from the pickles,
+        # so caches built for one (price cube, snapshot) must not serve the other
+        transform = self.header.get("transform")
+        if transform is None:
+            return self.header["source_digest"][:12]
+        return hashlib.sha256(f"{self.header['source_digest']}|{transform}".encode()).hexdigest()[:12]
+
+    def columns(self, key):
+        return self.areas[key]["columns"]
+
+    def tree(self, key):
+        arrays = {}
+        for name, spec in self.areas[key]["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=self._payload_start + spec["offset"]
+            ).reshape(spec["shape"])
+        return FlatTree(**arrays)
+
+    def verify(self):
+        digest = hashlib.sha256()
+        view = memoryview(self._mmap)[self._payload_start:]
+        for start in range(0, len(view), 1 << 20):
+            digest.update(view[start:start + (1 << 20)])
+        view.release()
+        return digest.hexdigest() == self.header["payload_sha256"]
+
+    def matches(self, index):
+        # Cheap staleness check against the pickles on disk: same set of areas
+        # and unchanged size/mtime for every model and column file.
+        if set(index) != set(self.areas):
+            return False
+        for key, (_, model_path, columns_path) in index.items():
+            source = self.areas[key]["source"]
+            if file_stamp(model_path) != source["model_stamp"] or \
+               file_stamp(columns_path) != source["columns_stamp"]:
+                return False
+        return True
+
+    def close(self):
+        # Arrays handed out by tree() keep the mapping alive; only drop our handle
+        self._mmap = None
+        self._file.close()
+
+
+if __name__ == "__main__":
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Build, verify or inspect the memory-mapped model bundle.")
+    parser.add_argument("command", choices=["build", "verify", "info"])
+    parser.add_argument("--path", default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        registry = ModelRegistry(bundle_path=None, compiled_dir=None)
+        header = build_bundle(registry.index, args.path)
+        print(f"✅ {len(header['areas'])} areas, {header['payload_bytes']} bytes, version {header['source_digest'][:12]}")
+
+    bundle = ModelBundle(args.path)
+    if args.command == "info":
+        print(json.dumps({k: v for k, v in bundle.header.items() if k != "areas"}, indent=2))
+        for key, spec in sorted(bundle.areas.items()):
+            nbytes = sum(int(np.prod(a["shape"])) * np.dtype(a["dtype"]).itemsize for a in spec["arrays"].values())
+            print(f"  {spec['area']}: {len(spec['columns'])} columns, {spec['arrays']['left']['shape'][0]} nodes, "
+                  f"{nbytes / 1e3:.1f} kB")
+        sys.exit(0)
+
+    ok = bundle.verify()
+    stale = not bundle.matches(ModelRegistry(bundle_path=None, compiled_dir=None).index)
+    print("✅ checksum ok" if ok else "❌ checksum mismatch")
+    if stale:
+        print("⚠️ bundle does not match the pickles in dt_models/ and trained_columns/")
+    sys.exit(0 if ok and not stale else 1)
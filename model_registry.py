@@ -0,0 +1,319 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+from feature_encoder import AreaEncoder
+from instrumentation import span, timed
+from model_bundle import BUNDLE_PATH, BundleError, ModelBundle, file_stamp, source_digest
+from tree_engine import ARRAYS, COMPILED_DIR, FlatTree, compiled_path
+
+# -----------------------------------------------------
+# 1. DIRECTORIES
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "dt_models")
+TRAINED_DIR = os.path.join(BASE_DIR, "trained_columns")
+
+MODEL_PREFIX = "dt_model_"
+COLUMNS_PREFIX = "trained_columns_"
+# Written by train_models.py: per area the SHA-256 of the model and columns pickle
+MANIFEST_NAME = "manifest.json"
+
+
+# -----------------------------------------------------
+# 2. Area Name Normalisation
+# -----------------------------------------------------
+def area_key(area_name_en):
+    # "Me'Aisem First", "Me_Aisem First" and "me aisem first" are the same area:
+    # filenames cannot hold the apostrophe, the UI and CSVs use it.
+    key = area_name_en.replace("_", " ").replace("'", " ")
+    return " ".join(key.lower().split())
+
+
+@timed("registry_scan")
+def _scan(directory, prefix):
+    found = {}
+    if not os.path.isdir(directory):
+        return found
+    for f in os.listdir(directory):
+        if f.lower().startswith(prefix) and f.lower().endswith(".pkl"):
+            area = f[len(prefix):-len(".pkl")]
+            found[area_key(area)] = (area, os.path.join(directory, f))
+    return found
+
+
+# -----------------------------------------------------
+# 3. Registry
+# -----------------------------------------------------
+def _is_fresh(compiled, source_path):
+    try:
+        oldest = min(os.path.getmtime(os.path.join(compiled, f"{name}.npy")) for name in ARRAYS)
+    except OSError:
+        return False
+    return oldest >= os.path.getmtime(source_path)
+
+
+class AreaModel:
+    __slots__ = ("area", "model_path", "columns", "encoder", "tree", "nbytes", "_model")
+
+    def __init__(self, area, model_path, columns, tree, model=None):
+        self.area = area
+        self.model_path = model_path
+        self.columns = columns
+        self.encoder = AreaEncoder(columns)
+        self.tree = tree
+        self._model = model
+        self.nbytes = tree.nbytes + (os.path.getsize(model_path) if model is not None else 0)
+
+    @property
+    def model(self):
+        # The sklearn estimator is only needed for export and parity checks;
+        # serving goes through the flat tree.
+        if self._model is None:
+            if self.model_path is None:
+                raise FileNotFoundError(f"❌ Model pickle not deployed for area '{self.area}'")
+            with open(self.model_path, "rb") as file:
+                with span("pickle_load"):
+                    self._model = pickle.load(file)
+        return self._model
+
+
+class ModelRegistry:
+    """Process-wide cache of per-area decision trees and their training columns.
+
+    The directory listing is done once; models are loaded lazily (or all at
+    once with ``preload``) and evicted least-recently-used once the resident
+    size of the loaded trees exceeds ``max_bytes``. Trees exported by
+    ``tree_engine.py export`` are read from ``compiled_dir`` when they are
+    newer than their pickle, so sklearn is not unpickled at all.
+
+    When a bundle built by ``model_bundle.py build`` matches the pickles on
+    disk (or the pickles are not deployed) and its payload checksum holds,
+    every area is served from the bundle's shared memory mapping instead.
+    A ``snapshot`` (see snapshot.py) built for the same model version takes
+    precedence over both.
+
+    Pickles of an area listed in the training manifest are only served when
+    both match its hashes: a retrain replaces the model and its columns one
+    after the other, and a crash (or a load) in between would otherwise pair
+    new columns with the old tree. A refused area is not retried until one
+    of its files or the manifest changes.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, trained_dir=TRAINED_DIR, compiled_dir=COMPILED_DIR,
+                 bundle_path=BUNDLE_PATH, max_bytes=None, preload=False, snapshot=None):
+        self.models_dir = models_dir
+        self.trained_dir = trained_dir
+        self.compiled_dir = compiled_dir
+        self.max_bytes = max_bytes
+        self.snapshot = snapshot
+
+        self.index = {}
+        models = _scan(models_dir, MODEL_PREFIX)
+        columns = _scan(trained_dir, COLUMNS_PREFIX)
+        for key in models.keys() & columns.keys():
+            area, model_path = models[key]
+            self.index[key] = (area, model_path, columns[key][1])
+
+        self.bundle = self._open_bundle(bundle_path)
+        if self.bundle is not None:
+            for key, spec in self.bundle.areas.items():
+                self.index.setdefault(key, (spec["area"], None, None))
+        self._model_version = None
+
+        self._cache = OrderedDict()
+        self._rejected = {}
+        self._lock = threading.RLock()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+        if preload:
+            self.preload()
+
+    def _open_bundle(self, bundle_path):
+        if not bundle_path or not os.path.exists(bundle_path):
+            return None
+        try:
+            # One SHA-256 pass over the payload per process; a corrupt bundle
+            # would otherwise serve wrong prices without any error
+            bundle = ModelBundle(bundle_path, verify=True)
+        except BundleError as e:
+            warnings.warn(str(e))
+            return None
+        if self.index and not bundle.matches(self.index):
+            warnings.warn(f"⚠️ Ignoring stale model bundle {bundle_path}; rebuild it with model_bundle.py build")
+            bundle.close()
+            return None
+        return bundle
+
+    @property
+    def model_version(self):
+        # Fingerprint of the served models: the bundle's source digest, or a
+        # hash of the pickles themselves when serving without a bundle.
+        if self._model_version is None:
+            if self.bundle is not None:
+                self._model_version = self.bundle.model_version
+            else:
+                self._model_version = source_digest(self.index)[:12]
+        return self._model_version
+
+    def areas(self):
+        return sorted(area for area, _, _ in self.index.values())
+
+    def __contains__(self, area_name_en):
+        return area_key(area_name_en) in self.index
+
+    def get(self, area_name_en):
+        key = area_key(area_name_en)
+        if key not in self.index:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            entry = self._load(key)
+            if entry is None:
+                return None
+            self._cache[key] = entry
+            self.cached_bytes += entry.nbytes
+            self._evict(keep=key)
+            return entry
+
+    def preload(self):
+        for key in sorted(self.index):
+            if self.max_bytes is not None and self.cached_bytes >= self.max_bytes:
+                break
+            self.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.cached_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "areas": len(self.index),
+                "resident": len(self._cache),
+                "cached_bytes": self.cached_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds": self.load_seconds,
+                "source": "bundle" if self.bundle is not None else "pickle",
+                "snapshot": self.snapshot.path if self.snapshot is not None else None,
+            }
+
+    @timed("model_load")
+    def _load(self, key):
+        area, model_path, columns_path = self.index[key]
+        start = time.perf_counter()
+        model = None
+        restored = self.snapshot.area(key, self.model_version) if self.snapshot is not None else None
+        if restored is not None:
+            entry = AreaModel(area, model_path, restored[1], restored[2])
+            self.load_seconds += time.perf_counter() - start
+            return entry
+        if self.bundle is not None:
+            entry = AreaModel(area, model_path, self.bundle.columns(key), self.bundle.tree(key))
+            self.load_seconds += time.perf_counter() - start
+            return entry
+
+        stamps = self._stamps(model_path, columns_path)
+        if self._rejected.get(key) == stamps:
+            return None
+        compiled = compiled_path(area, self.compiled_dir) if self.compiled_dir else None
+        from_compiled = compiled and _is_fresh(compiled, model_path)
+
+        # Hash the bytes that are loaded, so the check and the load see the
+        # same files. A fresh compiled tree was exported from the current
+        # model pickle, and a retrain swaps the columns in first, so on that
+        # path the columns alone show a torn pair.
+        with open(columns_path, "rb") as file:
+            raw_columns = file.read()
+        raw_model = None
+        if not from_compiled:
+            with open(model_path, "rb") as file:
+                raw_model = file.read()
+        expected = self._manifest_entry(key)
+        if expected is not None and (
+                hashlib.sha256(raw_columns).hexdigest() != expected.get("columns_sha256") or
+                raw_model is not None and hashlib.sha256(raw_model).hexdigest() != expected.get("model_sha256")):
+            self._rejected[key] = stamps
+            warnings.warn(f"⚠️ Not serving '{area}': model and columns do not match {MANIFEST_NAME} "
+                          f"(retrain running or interrupted)")
+            self.load_seconds += time.perf_counter() - start
+            return None
+        self._rejected.pop(key, None)
+        columns = pickle.loads(raw_columns)
+
+        if from_compiled:
+            tree = FlatTree.load(compiled)
+        else:
+            model = pickle.loads(raw_model)
+            tree = FlatTree.from_sklearn(model)
+        self.load_seconds += time.perf_counter() - start
+        return AreaModel(area, model_path, columns, tree, model)
+
+    def _stamps(self, model_path, columns_path):
+        # What a refusal depends on: the pair and the manifest
+        paths = (model_path, columns_path, os.path.join(self.models_dir, MANIFEST_NAME))
+        return [file_stamp(path) if os.path.exists(path) else None for path in paths]
+
+    def _manifest_entry(self, key):
+        # Read per load: a retrain rewrites it as each area is on disk
+        try:
+            with open(os.path.join(self.models_dir, MANIFEST_NAME)) as file:
+                return json.load(file).get("areas", {}).get(key)
+        except (OSError, ValueError):
+            return None
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        while self.cached_bytes > self.max_bytes and len(self._cache) > 1:
+            key, entry = next(iter(self._cache.items()))
+            if key == keep:
+                break
+            del self._cache[key]
+            self.cached_bytes -= entry.nbytes
+            self.evictions += 1
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    # MODEL_CACHE_MAX_BYTES bounds resident models, MODEL_PRELOAD=1 warms all areas at startup
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from snapshot import get_snapshot
+
+                max_bytes = os.environ.get("MODEL_CACHE_MAX_BYTES")
+                _registry = ModelRegistry(
+                    max_bytes=int(max_bytes) if max_bytes else None,
+                    preload=os.environ.get("MODEL_PRELOAD", "0") == "1",
+                    snapshot=get_snapshot(),
+                )
+    return _registry
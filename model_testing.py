@@ -1,8 +1,14 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import ast
-from model_testing1 import predict_with_area  # replace file name
+
+# Client mode: with PREDICTION_SERVICE_URL set, predictions come from prediction_service.py
+if os.environ.get("PREDICTION_SERVICE_URL"):
+    from prediction_client import predict_with_area
+else:
+    from model_testing1 import predict_with_area  # replace file name
 
 
 
@@ -10,7 +16,11 @@ from model_testing1 import predict_with_area  # replace file name
 # ---------------------------------------------------
 # LOAD RANGE FILE
 # ---------------------------------------------------
-range_df = pd.read_csv("column_input_ranges.csv")
+@st.cache_data
+def load_range_df():
+    return pd.read_csv("column_input_ranges.csv")
+
+range_df = load_range_df()
 
 # CLEAN LIST COLUMNS
 #list_cols = ["rooms_en", "floor_bin", "has_parking", "swimming_pool", "balcony", "elevator"]
@@ -84,7 +94,6 @@ if area != "-- Select Area --":
         
         if final_df is not None:
             #st.success("✅ Prediction Successful!")
-            print(f'predicted_price (11-2025) : {final_df[final_df['month'] == '2025-11-01']['median_price']}')
             st.write("### Last 10 Months Forecast")
             st.dataframe(final_df.tail(10))
 
@@ -1,9 +1,11 @@
-import streamlit as st
-import pandas as pd
+import itertools
 import numpy as np
 import os
-import pickle
-from statsmodels.nonparametric.smoothers_lowess import lowess
+from model_registry import area_key, get_registry
+from data_store import get_data_store
+from instrumentation import span, start_profiler_from_env, timed, trace
+from price_cube import get_price_cube
+from smoothing import get_smoothing_cache
 
 # -----------------------------------------------------
 # 1. DIRECTORIES
@@ -13,96 +15,367 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 models_dir = os.path.join(BASE_DIR, "dt_models")
 trained_dir = os.path.join(BASE_DIR, "trained_columns")
 
+start_profiler_from_env()
+
+# streamlit and pandas are imported where they are used, so the prediction
+# core (predict_series, used by the HTTP service) starts without them.
+
 # -----------------------------------------------------
 # 2. Load Training Columns
 # -----------------------------------------------------
 def load_columns(area_name_en):
-    area_name_en = area_name_en.replace("_", " ").strip()
+    import streamlit as st
 
-    for f in os.listdir(trained_dir):
-        if f.lower() == f"trained_columns_{area_name_en}.pkl".lower() or \
-           f.lower() == f"trained_columns_{area_name_en.replace(' ', '_')}.pkl".lower():
-            with open(os.path.join(trained_dir, f), "rb") as file:
-                return pickle.load(file)
-
-    st.error(f"❌ Trained columns file missing for area: {area_name_en}")
-    return None
+    entry = get_registry().get(area_name_en)
+    if entry is None:
+        st.error(f"❌ Trained columns file missing for area: {area_name_en}")
+        return None
+    return entry.columns
 
 
 # -----------------------------------------------------
 # 3. Load Decision Tree Model
 # -----------------------------------------------------
 def load_model(area_name_en):
-    area_name_en = area_name_en.replace("_", " ").strip()
+    import streamlit as st
 
-    for f in os.listdir(models_dir):
-        if f.lower() == f"dt_model_{area_name_en}.pkl".lower() or \
-           f.lower() == f"dt_model_{area_name_en.replace(' ', '_')}.pkl".lower():
-            with open(os.path.join(models_dir, f), "rb") as file:
-                return pickle.load(file)
-
-    st.error(f"❌ Model file missing for area: {area_name_en}")
-    return None
+    entry = get_registry().get(area_name_en)
+    if entry is None:
+        st.error(f"❌ Model file missing for area: {area_name_en}")
+        return None
+    return entry.model
 
 
 # -----------------------------------------------------
 # 4. Prediction Function
 # -----------------------------------------------------
-def predict_with_area(input_data):
+def predict_with_area(input_data, bands=False):
+    import streamlit as st
+
+    final_df, messages = predict_area(input_data, bands)
+    for level, message in messages:
+        getattr(st, level)(message)
+    return final_df
+
+
+def predict_area(input_data, bands=False):
+    # Streamlit-free core of predict_with_area:
+    # returns (final_df or None, [(level, message), ...]).
+    # With bands, final_df also has lower_price / upper_price from the SARIMA
+    # bounds (NaN over the history). Every stage is a span, see instrumentation.py.
+    with trace("predict_area"):
+        months, paths, messages = _predict_series(input_data)
+        if months is None:
+            return None, messages
+
+        with span("frame"):
+            import pandas as pd
+
+            final_df = pd.DataFrame({"month": months, "median_price": paths[1]})
+            if bands:
+                final_df["lower_price"] = paths[0]
+                final_df["upper_price"] = paths[2]
+        return final_df, messages
+
+
+def _unknown_message(field, value, area):
+    if value is None:
+        return f"⚠️ {field} is missing, priced as 0 for area: {area}"
+    return f"⚠️ {field} '{value}' was not seen in training for area: {area}"
+
+
+def predict_series(input_data, bands=False):
+    # predict_area without pandas: (months or None, prices, messages); with
+    # bands, prices is a (3, months) array of the lower, point and upper path
+    with trace("predict_series"):
+        months, paths, messages = _predict_series(input_data)
+        return months, (paths if bands or paths is None else paths[1]), messages
+
+
+def _forecast_window(store, area):
+    # (months, (3, months) factors, history): the forecast from the month after
+    # the last history month on. An ingest without a reforecast moves history
+    # into months the stored SARIMA run covers; those months show the history.
+    forecast_area = store.get_forecast(area)
+    historic_area = store.get_history(area)
+    if forecast_area is None:
+        return np.array([], dtype=object), np.empty((3, 0)), historic_area
+    start = 0
+    if historic_area is not None and len(historic_area):
+        start = int(np.searchsorted(forecast_area.month, historic_area.month[-1], side="right"))
+    return forecast_area.month[start:], forecast_area.factors[:, start:], historic_area
+
+
+def _area_prices(entry, key, features, inputs=None, cube=None):
+    # Base median price of each encoded row of one area. The tree walk costs
+    # the same per level for 1 row or 30, so small groups are looked up in
+    # the price cube (same values) when one was built for the served models.
+    with span("predict"):
+        prices = np.full(len(features), np.nan)
+        if cube is not None and inputs is not None and len(inputs) < 32:
+            for row, input_data in enumerate(inputs):
+                price = cube.lookup(key, input_data)
+                if price is not None:
+                    prices[row] = price
+        missing = np.flatnonzero(np.isnan(prices))
+        if len(missing):
+            prices[missing] = entry.tree.predict(features[missing])
+    return prices
+
+
+def _area_paths(store, key, prices):
+    # (months, (rows, 3, months) lower, point and upper paths) for one area:
+    # the smoothed history (point path only), then the forecast scaled by
+    # each row's price. The last history month shows the first forecast.
+    with span("forecast"):
+        forecast_month, factors, historic_area = _forecast_window(store, key)
+        forecast_paths = prices[:, None, None] * factors[None]
+
+    with span("history"):
+        historic_month = historic_area.month if historic_area is not None else np.array([], dtype=object)
+        historic_paths = np.full((len(prices), 3, len(historic_month)), np.nan)
+        if historic_area is not None and len(historic_area):
+            # Smoothing (statsmodels LOWESS by default) runs once per area and history file
+            historic_paths[:, 1] = get_smoothing_cache().get(key, frac=0.04)
+            if forecast_paths.shape[2]:
+                historic_paths[:, :, -1] = forecast_paths[:, :, 0]
+
+    months = np.concatenate([historic_month, forecast_month])
+    return months, np.concatenate([historic_paths, forecast_paths], axis=2)
+
+
+def _predict_area(registry, cube, store, key, inputs, areas):
+    # predict_series for inputs of one area (areas: each input's area name,
+    # for messages). Returns (months or None, (rows, 3, months) paths or None,
+    # messages per row).
+    with span("registry_get"):
+        entry = registry.get(key)
+    if entry is None:
+        return None, None, [[("error", f"❌ Model file missing for area: {area}")] for area in areas]
 
-    forecast_df = pd.read_csv(os.path.join(BASE_DIR, "Sarima_forecast_6M.csv"))
-    historic_df = pd.read_csv(os.path.join(BASE_DIR, "historical_df.csv"))
+    # One-hot encode straight into the model's column layout
+    messages = [[] for _ in inputs]
+    with span("encode"):
+        features = np.zeros((len(inputs), entry.encoder.n_features))
+        for row, (input_data, area) in enumerate(zip(inputs, areas)):
+            for field, value in entry.encoder.encode(input_data, out=features[row]):
+                messages[row].append(("warning", _unknown_message(field, value, area)))
 
+    prices = _area_prices(entry, key, features, inputs, cube)
+    months, paths = _area_paths(store, key, prices)
+    return months, paths, messages
+
+
+def _predict_series(input_data):
     area = input_data["area_name_en"].replace("_", " ").strip()
+    registry = get_registry()
+    months, paths, messages = _predict_area(registry, get_price_cube(registry), get_data_store(),
+                                            area_key(area), [input_data], [area])
+    return months, (paths[0] if paths is not None else None), messages[0]
 
-    # Load model + expected columns
-    train_columns = load_columns(area)
-    model = load_model(area)
 
-    if train_columns is None or model is None:
-        return None
+@timed("predict_series_many", trace)
+def predict_series_many(inputs, bands=False):
+    # predict_series for a list of inputs (see micro_batcher.py): one feature
+    # matrix, tree call and forecast broadcast per area, and the smoothed
+    # history shared by every row of the area. Returns one
+    # (months or None, prices, messages) per input, in order.
+    store = get_data_store()
+    registry = get_registry()
+    cube = get_price_cube(registry)
+    results = [None] * len(inputs)
 
-    # One-hot encode
-    temp = pd.DataFrame([input_data])
-    temp["area_name_en"] = area
-    temp = pd.get_dummies(temp)
+    groups = {}
+    for i, input_data in enumerate(inputs):
+        area = input_data["area_name_en"].replace("_", " ").strip()
+        groups.setdefault(area_key(area), []).append((i, area))
 
-    # Add missing columns
-    for col in train_columns:
-        if col not in temp.columns:
-            temp[col] = 0
+    for key, members in groups.items():
+        rows = [i for i, _ in members]
+        months, paths, messages = _predict_area(registry, cube, store, key, [inputs[i] for i in rows],
+                                                [area for _, area in members])
+        for row, i in enumerate(rows):
+            if paths is None:
+                results[i] = (None, None, messages[row])
+            else:
+                results[i] = (months, paths[row] if bands else paths[row, 1], messages[row])
+    return results
 
-    temp = temp[train_columns]
 
-    # Predict base median price
-    predicted_price = model.predict(temp)[0]
+# -----------------------------------------------------
+# 5. Batch Prediction
+# -----------------------------------------------------
+@timed("predict_many", trace)
+def predict_many(inputs):
+    # inputs: list of input_data dicts or a DataFrame with the same columns.
+    # Returns one row per (input row, forecast month) with the point forecast
+    # and the SARIMA lower / upper bounds; rows whose area has no model keep
+    # a NaN base_price and a single row without a month, as do rows without
+    # a usable area_name_en (listed in unknown_categories).
+    # unknown_categories lists inputs the area's model was never trained on.
+    import pandas as pd
 
-    # Forecast section
-    forecast_area = forecast_df[forecast_df["area_name_en"] == area].copy()
-    forecast_area["median_price"] = predicted_price * forecast_area["growth_factor"]
-    forecast_area = forecast_area[["month", "median_price"]]
+    frame = inputs.reset_index(drop=True) if isinstance(inputs, pd.DataFrame) else pd.DataFrame(list(inputs))
+    if "area_name_en" not in frame.columns:
+        frame["area_name_en"] = None
+    # A missing or non-text area gets no model; groupby drops its None key
+    areas = pd.Series([area.replace("_", " ").strip() if isinstance(area, str) else None
+                       for area in frame["area_name_en"]], dtype=object)
+    keys = areas.map(lambda area: area_key(area) if area is not None else None)
 
-    # Historic section
-    historic_area = historic_df[historic_df["area_name_en"] == area].copy()
+    registry = get_registry()
+    store = get_data_store()
 
-    if not historic_area.empty:
-        historic_area = historic_area.sort_values("month").reset_index(drop=True)
+    columns = {field: frame[field].to_numpy(dtype=object) for field in frame.columns}
+    unknown = [[] if area is not None else [f"area_name_en={value}"]
+               for area, value in zip(areas, frame["area_name_en"])]
+    base_price = np.full(len(frame), np.nan)
+    row_parts, month_parts, path_parts = [], [], []
+    covered = np.zeros(len(frame), dtype=bool)
 
-        smoothed = lowess(
-            endog=historic_area["median_price"].values,
-            exog=np.arange(len(historic_area)),
-            frac=0.04
-        )
+    for key, idx in keys.groupby(keys, sort=False).indices.items():
+        entry = registry.get(key)
+        if entry is None:
+            continue
 
-        historic_area["median_price"] = smoothed[:, 1]
+        # One dense matrix per area, one predict call per area
+        with span("encode"):
+            X, group_unknown = entry.encoder.encode_columns(
+                {field: values[idx] for field, values in columns.items()}, len(idx)
+            )
+        base_price[idx] = _area_prices(entry, key, X)
+        for row, field, value in group_unknown:
+            unknown[idx[row]].append(f"{field}={value}")
 
-        # Replace last historic with first forecast
-        if not forecast_area.empty:
-            historic_area.loc[historic_area.index[-1], "median_price"] = forecast_area.iloc[0]["median_price"]
+        forecast_month, factors, _ = _forecast_window(store, key)
+        if not len(forecast_month):
+            continue
 
-    final_df = pd.concat([historic_area[["month", "median_price"]], forecast_area], ignore_index=True)
-    return final_df
+        # All three paths of every row in one broadcast: (3, rows * months)
+        n_months = len(forecast_month)
+        row_parts.append(np.repeat(idx, n_months))
+        month_parts.append(np.tile(forecast_month, len(idx)))
+        path_parts.append((factors[:, None, :] * base_price[None, idx, None]).reshape(3, -1))
+        covered[idx] = True
+
+    # Rows without a forecast still appear once
+    missing = np.flatnonzero(~covered)
+    row_parts.append(missing)
+    month_parts.append(np.full(len(missing), None, dtype=object))
+    path_parts.append(np.full((3, len(missing)), np.nan))
+
+    rows = np.concatenate(row_parts)
+    order = np.argsort(rows, kind="stable")
+    rows = rows[order]
+    paths = np.concatenate(path_parts, axis=1)[:, order]
+
+    return pd.DataFrame({
+        "row": rows,
+        "area_name_en": areas.to_numpy(dtype=object)[rows],
+        "base_price": base_price[rows],
+        "month": np.concatenate(month_parts)[order],
+        "median_price": paths[1],
+        "lower_price": paths[0],
+        "upper_price": paths[2],
+        "unknown_categories": [", ".join(unknown[row]) for row in rows],
+    })
+
+
+# -----------------------------------------------------
+# 6. What-If Sweeps
+# -----------------------------------------------------
+RANGES_PATH = os.path.join(BASE_DIR, "column_input_ranges.csv")
+SWEEP_POINTS = 50
+MAX_SWEEP_ROWS = 20000
+
+_area_ranges = None
+
+
+def _procedure_area_range(area_name_en):
+    # (min, max) procedure_area the UI offers for the area
+    global _area_ranges
+    if _area_ranges is None:
+        import pandas as pd
+
+        ranges = pd.read_csv(RANGES_PATH)
+        _area_ranges = {area_key(area): (float(lo), float(hi))
+                        for area, lo, hi in zip(ranges["area_name_en"], ranges["min"], ranges["max"])}
+    return _area_ranges.get(area_key(area_name_en))
+
+
+def sweep_values(area_name_en, field, points=SWEEP_POINTS):
+    # Default values of one sweep axis: procedure_area over the area's
+    # min-max range, every category the area's model was trained on, 0/1 flags
+    entry = get_registry().get(area_name_en)
+    if entry is None:
+        raise ValueError(f"❌ Model file missing for area: {area_name_en}")
+    if field == "procedure_area":
+        bounds = _procedure_area_range(area_name_en)
+        if bounds is None:
+            raise ValueError(f"❌ No procedure_area range for area: {area_name_en}")
+        return np.linspace(bounds[0], bounds[1], points)
+    if field in entry.encoder.categories and field != "area_name_en":
+        return list(entry.encoder.categories[field])
+    if field in entry.encoder.numeric:
+        return [0, 1]
+    raise ValueError(f"❌ '{field}' is not an input of the model for area: {area_name_en}")
+
+
+def sweep_with_area(input_data, axes, points=SWEEP_POINTS):
+    # predict_sweep for the Streamlit UI: errors are shown, not raised
+    import streamlit as st
+
+    try:
+        return predict_sweep(input_data, axes, points)
+    except ValueError as e:
+        st.error(str(e))
+        return None
+
+
+@timed("predict_sweep", trace)
+def predict_sweep(input_data, axes, points=SWEEP_POINTS):
+    """Price surface over one or two inputs, all other inputs as in input_data.
 
+    ``axes`` is a list of field names (values from sweep_values) or a dict
+    {field: values}. Every grid point goes through predict_many in one pass.
+    Returns one row per (grid point, forecast month) with the axis columns,
+    base_price, month, median_price and the lower / upper bounds.
+    """
+    import pandas as pd
 
+    area = input_data["area_name_en"]
+    if not isinstance(axes, dict):
+        axes = list(axes)
+        if not all(isinstance(field, str) for field in axes):
+            raise ValueError("❌ Sweep axes must be field names")
+        axes = {field: None for field in axes}
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("❌ A sweep takes one or two axes")
+    if "area_name_en" in axes:
+        raise ValueError("❌ area_name_en cannot be swept, one area is predicted at a time")
+    # Bounded before anything is built: no axis can hold more than the whole grid
+    if isinstance(points, bool) or not isinstance(points, (int, np.integer)) or not 1 <= points <= MAX_SWEEP_ROWS:
+        raise ValueError(f"❌ points must be an integer between 1 and {MAX_SWEEP_ROWS}, got {points!r}")
+    values = {}
+    for field, vals in axes.items():
+        if vals is None:
+            values[field] = list(sweep_values(area, field, points))
+        elif isinstance(vals, (str, bytes, dict)) or not hasattr(vals, "__iter__"):
+            raise ValueError(f"❌ Values of sweep axis '{field}' must be a list")
+        else:
+            values[field] = list(itertools.islice(vals, MAX_SWEEP_ROWS + 1))
+    n = int(np.prod([len(vals) for vals in values.values()]))
+    if not n or n > MAX_SWEEP_ROWS:
+        raise ValueError(f"❌ A sweep grid must have between 1 and {MAX_SWEEP_ROWS} points, got {n}")
 
+    # Grid in row-major order: the last axis varies fastest
+    grid = np.indices([len(vals) for vals in values.values()]).reshape(len(values), -1)
+    columns = {field: np.full(n, value, dtype=object) for field, value in input_data.items()}
+    for (field, vals), index in zip(values.items(), grid):
+        columns[field] = np.asarray(vals, dtype=object)[index]
+    result = predict_many(pd.DataFrame(columns))
 
+    out = pd.DataFrame({field: columns[field][result["row"].to_numpy()] for field in values}).infer_objects()
+    for col in ["base_price", "month", "median_price", "lower_price", "upper_price"]:
+        out[col] = result[col].to_numpy()
+    return out
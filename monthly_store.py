@@ -0,0 +1,284 @@
+import argparse
+import glob
+import hashlib
+import os
+import threading
+import time
+import uuid
+import warnings
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from data_store import BASE_DIR, HISTORY_PATH, STORE_DIR
+from model_registry import area_key
+from quantile_sketch import QUANTILES, KLLSketch
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+
+FULL_HISTORY_PATH = os.path.join(BASE_DIR, "historical_data.csv")
+
+# historical_df.csv (what predict_with_area plots) is historical_data.csv from 2020 on
+HISTORY_START = "2020-01-01"
+TRANSACTION_COLUMNS = ["area_name_en", "instance_date", "meter_sale_price"]
+MEDIAN_COLUMNS = ["area_name_en", "month", "median_price", "p10_price", "p90_price", "count"]
+
+
+def _write_parquet(df, path):
+    # Readers only pick up *.parquet, so a half-written file is never seen
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _write_text(text, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+# -----------------------------------------------------
+# 2. Store
+# -----------------------------------------------------
+class MonthlyStore:
+    """Monthly median meter_sale_price per area, updated incrementally.
+
+    Raw transactions are appended as one Parquet file per batch under
+    ``transactions/area=<key>/month=<YYYY-MM>/``; ``medians/area=<key>.parquet``
+    holds one area's monthly p10/median/p90 and transaction counts, and
+    ``sketches/area=<key>.parquet`` a KLL quantile sketch per month. An
+    ingest streams the batch into the sketches of only the (area, month)
+    buckets it touched and rewrites only those areas' files; earlier
+    batches are never re-read. Quantiles are exact up to SKETCH_K
+    transactions per bucket and within ~1% rank error beyond.
+
+    Months seeded from historical_data.csv have a median but no sketch
+    (count 0), so a batch cannot be combined with them: their median is
+    kept, and transactions for them are stored but not counted (with a
+    warning).
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.medians_dir = os.path.join(root, "medians")
+        self.sketches_dir = os.path.join(root, "sketches")
+        self.transactions_dir = os.path.join(root, "transactions")
+        self.version_path = os.path.join(root, "VERSION")
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.version_path)
+
+    def version(self):
+        if not self.exists():
+            return None
+        with open(self.version_path) as file:
+            return file.read().strip()
+
+    def _medians_path(self, key):
+        return os.path.join(self.medians_dir, f"area={quote(key, safe=' ')}.parquet")
+
+    def _sketches_path(self, key):
+        return os.path.join(self.sketches_dir, f"area={quote(key, safe=' ')}.parquet")
+
+    def _partition_dir(self, key, month):
+        return os.path.join(self.transactions_dir, f"area={quote(key, safe=' ')}", f"month={month[:7]}")
+
+    # ---- reads ----
+    def medians(self, areas=None):
+        if areas is None:
+            paths = sorted(glob.glob(os.path.join(self.medians_dir, "*.parquet")))
+        else:
+            paths = [self._medians_path(area_key(area)) for area in areas]
+            paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return pd.DataFrame(columns=MEDIAN_COLUMNS)
+        return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+    def history_frame(self, areas=None, start=HISTORY_START):
+        # Same rows and columns as historical_df.csv
+        df = self.medians(areas)
+        if start is not None:
+            df = df[df["month"] >= start]
+        return df[["area_name_en", "month", "median_price"]].reset_index(drop=True)
+
+    def series(self, areas=None):
+        # Per-area monthly series in the shape sarima_forecast.py fits
+        from sarima_forecast import split_series
+
+        df = self.medians(areas).rename(columns={"month": "year_month", "median_price": "meter_sale_price"})
+        return split_series(df)
+
+    def transactions(self, area_name_en, month):
+        paths = sorted(glob.glob(os.path.join(self._partition_dir(area_key(area_name_en), month), "*.parquet")))
+        if not paths:
+            return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+        return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+    # ---- writes ----
+    def seed(self, path=FULL_HISTORY_PATH):
+        # Starts the store from the existing monthly medians
+        df = pd.read_csv(path).rename(columns={"year_month": "month", "meter_sale_price": "median_price"})
+        df["p10_price"] = np.nan
+        df["p90_price"] = np.nan
+        df["count"] = 0
+        with self._lock:
+            os.makedirs(self.medians_dir, exist_ok=True)
+            for area, group in df.groupby("area_name_en", sort=False):
+                medians = group[MEDIAN_COLUMNS].sort_values("month", kind="stable")
+                _write_parquet(medians.reset_index(drop=True), self._medians_path(area_key(area)))
+            with open(path, "rb") as file:
+                _write_text(hashlib.sha256(file.read()).hexdigest(), self.version_path)
+        return sorted(df["area_name_en"].unique())
+
+    def ingest(self, transactions, batch_id=None):
+        """Append a batch of raw transactions; returns {area_name_en: [month, ...]} updated."""
+        missing = [col for col in TRANSACTION_COLUMNS if col not in transactions.columns]
+        if missing:
+            raise ValueError(f"❌ Transactions are missing columns {missing}")
+
+        df = transactions.copy()
+        df["instance_date"] = pd.to_datetime(df["instance_date"], errors="coerce")
+        df["meter_sale_price"] = pd.to_numeric(df["meter_sale_price"], errors="coerce")
+        df = df.dropna(subset=TRANSACTION_COLUMNS)
+        month = df["instance_date"].dt.to_period("M").dt.to_timestamp().dt.strftime("%Y-%m-%d")
+        key = df["area_name_en"].map(area_key)
+
+        batch_id = batch_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        touched = {}
+        with self._lock:
+            for (k, m), group in df.groupby([key, month], sort=True):
+                part_dir = self._partition_dir(k, m)
+                os.makedirs(part_dir, exist_ok=True)
+                _write_parquet(group.reset_index(drop=True), os.path.join(part_dir, f"{batch_id}.parquet"))
+                touched.setdefault(k, {})[m] = group["meter_sale_price"].to_numpy(dtype=np.float64)
+
+            os.makedirs(self.medians_dir, exist_ok=True)
+            os.makedirs(self.sketches_dir, exist_ok=True)
+            names = {}
+            for k, prices in touched.items():
+                names[k], touched[k] = self._update_area(k, prices, df.loc[key == k, "area_name_en"].iloc[0])
+            touched = {k: months for k, months in touched.items() if months}
+
+            version = hashlib.sha256(f"{self.version()}|{batch_id}|{sorted(touched.items())}".encode()).hexdigest()
+            _write_text(version, self.version_path)
+        return {names[k]: months for k, months in touched.items()}
+
+    def sketches(self, area_name_en):
+        path = self._sketches_path(area_key(area_name_en))
+        if not os.path.exists(path):
+            return {}
+        df = pd.read_parquet(path)
+        return {month: KLLSketch.from_bytes(raw) for month, raw in zip(df["month"], df["sketch"])}
+
+    def _update_area(self, key, prices, area_name_en):
+        # Streams the new prices into the touched months' sketches; only
+        # those months' quantiles are recomputed. Returns the months updated.
+        path = self._medians_path(key)
+        medians = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame(columns=MEDIAN_COLUMNS)
+        if len(medians):
+            area_name_en = medians["area_name_en"].iloc[0]
+
+        sketches = self.sketches(key)
+        seeded = set(medians.loc[medians["count"] == 0, "month"]) - set(sketches)
+        kept = sorted(month for month in prices if month in seeded)
+        if kept:
+            warnings.warn(f"⚠️ {area_name_en}: kept the seeded medians of {', '.join(m[:7] for m in kept)}; "
+                          f"their transactions are stored but not counted")
+            prices = {month: values for month, values in prices.items() if month not in seeded}
+            if not prices:
+                return area_name_en, []
+
+        rows = []
+        for month, values in prices.items():
+            sketch = sketches.setdefault(month, KLLSketch()).update(values)
+            p10, p50, p90 = sketch.quantile(QUANTILES)
+            rows.append({"area_name_en": area_name_en, "month": month, "median_price": p50,
+                         "p10_price": p10, "p90_price": p90, "count": sketch.n})
+
+        medians = pd.concat([medians[~medians["month"].isin(prices)], pd.DataFrame(rows)], ignore_index=True)
+        medians = medians.sort_values("month", kind="stable").reset_index(drop=True)[MEDIAN_COLUMNS]
+        medians["count"] = medians["count"].astype(np.int64)
+        _write_parquet(medians, path)
+
+        months = sorted(sketches)
+        _write_parquet(pd.DataFrame({"month": months, "sketch": [sketches[m].to_bytes() for m in months]}),
+                       self._sketches_path(key))
+        return area_name_en, sorted(prices)
+
+    def export(self, full_history_path=FULL_HISTORY_PATH, history_path=HISTORY_PATH):
+        # Writes the legacy CSVs (e.g. for the notebook); serving reads the store
+        df = self.medians().sort_values(["month", "area_name_en"], kind="stable").reset_index(drop=True)
+        full = df.rename(columns={"month": "year_month", "median_price": "meter_sale_price"})
+        full[["area_name_en", "year_month", "meter_sale_price"]].to_csv(f"{full_history_path}.tmp", index=False)
+        os.replace(f"{full_history_path}.tmp", full_history_path)
+        df[df["month"] >= HISTORY_START][["area_name_en", "month", "median_price"]].to_csv(f"{history_path}.tmp")
+        os.replace(f"{history_path}.tmp", history_path)
+
+
+# -----------------------------------------------------
+# 3. Ingest + Cache Notification
+# -----------------------------------------------------
+def ingest_transactions(transactions, store=None, reforecast=False):
+    """Ingest a batch and bring this process's caches up to date.
+
+    Only the touched areas are replaced in the data store and re-smoothed;
+    with ``reforecast`` only they are refit by sarima_forecast.py.
+    """
+    from data_store import get_data_store
+    from smoothing import get_smoothing_cache
+
+    store = store or MonthlyStore()
+    if not store.exists():
+        store.seed()
+    touched = store.ingest(transactions)
+    if not touched:
+        return touched
+
+    get_data_store().update_history(store.history_frame(touched), store.version())
+    get_smoothing_cache().warm(areas=list(touched))
+
+    if reforecast:
+        from sarima_forecast import reforecast as refit
+
+        refit(areas=list(touched), series=store.series(touched))
+    return touched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental monthly median store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    seed = sub.add_parser("seed", help="start the store from historical_data.csv")
+    seed.add_argument("--history", default=FULL_HISTORY_PATH)
+    ingest = sub.add_parser("ingest", help="append a CSV or Parquet batch of transactions")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--reforecast", action="store_true", help="refit SARIMA for the touched areas")
+    sub.add_parser("export", help="rewrite historical_data.csv and historical_df.csv from the store")
+    args = parser.parse_args()
+
+    store = MonthlyStore()
+    start = time.perf_counter()
+    if args.command == "seed":
+        areas = store.seed(args.history)
+        print(f"✅ Seeded {len(areas)} areas from {args.history}")
+    elif args.command == "export":
+        store.export()
+        print(f"✅ Exported {FULL_HISTORY_PATH} and {HISTORY_PATH}")
+    else:
+        if not store.exists():
+            store.seed()
+        touched = set()
+        for path in args.paths:
+            batch = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+            for area, months in sorted(store.ingest(batch).items()):
+                touched.add(area)
+                print(f"✅ {area}: {', '.join(m[:7] for m in months)}")
+        if args.reforecast and touched:
+            from sarima_forecast import reforecast
+
+            reforecast(areas=sorted(touched), series=store.series(touched))
+    print(f"Done in {time.perf_counter() - start:.2f}s")
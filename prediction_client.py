@@ -0,0 +1,73 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import streamlit as st
+
+# -----------------------------------------------------
+# 1. SERVICE
+# -----------------------------------------------------
+#
+# Thin Streamlit front end over prediction_service.py: the UI scripts import
+# predict_with_area from here when PREDICTION_SERVICE_URL is set, so models
+# and data stay resident in the service instead of every Streamlit session.
+
+SERVICE_URL = os.environ.get("PREDICTION_SERVICE_URL", "http://127.0.0.1:8000").rstrip("/")
+TIMEOUT = float(os.environ.get("PREDICTION_SERVICE_TIMEOUT", "10"))
+
+
+def _call(path, payload=None):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(
+        f"{SERVICE_URL}{path}", data=data, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            return {"error": json.loads(e.read()).get("error", str(e))}
+        except ValueError:
+            return {"error": f"❌ Prediction service error: {e}"}
+    except (urllib.error.URLError, TimeoutError) as e:
+        return {"error": f"❌ Prediction service unreachable at {SERVICE_URL}: {e}"}
+
+
+# -----------------------------------------------------
+# 2. Client Functions
+# -----------------------------------------------------
+def predict_with_area(input_data, bands=False):
+    result = _call("/predict?bands=1" if bands else "/predict", input_data)
+    if "error" in result:
+        st.error(result["error"])
+        return None
+    for message in result.get("warnings", []):
+        st.warning(message)
+    columns = ["month", "median_price"] + (["lower_price", "upper_price"] if bands else [])
+    return pd.DataFrame(result["rows"], columns=columns)
+
+
+def predict_many(inputs):
+    result = _call("/predict/batch", {"inputs": list(inputs)})
+    if "error" in result:
+        st.error(result["error"])
+        return None
+    return pd.DataFrame(result["rows"])
+
+
+def sweep_with_area(input_data, axes, points=50):
+    result = _call("/predict/sweep", {"input": input_data, "axes": axes, "points": points})
+    if "error" in result:
+        st.error(result["error"])
+        return None
+    return pd.DataFrame(result["rows"])
+
+
+def load_ranges():
+    result = _call("/areas")
+    if "error" in result:
+        st.error(result["error"])
+        return None
+    return pd.DataFrame(result["areas"])
@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import math
+import os
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from data_store import BASE_DIR, get_data_store
+from instrumentation import SamplingProfiler, metrics as stage_metrics
+from micro_batcher import BATCH_WINDOW_MS, MicroBatcher, Overloaded
+from model_registry import get_registry
+from model_testing1 import SWEEP_POINTS, predict_many, predict_series, predict_series_many, predict_sweep
+from price_cube import get_price_cube
+from smoothing import get_smoothing_cache
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+
+RANGES_PATH = os.path.join(BASE_DIR, "column_input_ranges.csv")
+MAX_BATCH = int(os.environ.get("PREDICTION_MAX_BATCH", "10000"))
+MAX_PROFILE_SECONDS = 60.0
+# /debug/profile exposes stack traces and slows the worker while it samples,
+# so it is only mounted with PREDICTION_DEBUG_PROFILE=1
+DEBUG_PROFILE = os.environ.get("PREDICTION_DEBUG_PROFILE", "0") == "1"
+
+_ranges = None
+_batcher = None
+
+
+def load_ranges():
+    # Per-area procedure_area bounds the UI offers, read once per process
+    global _ranges
+    if _ranges is None:
+        import pandas as pd
+
+        df = pd.read_csv(RANGES_PATH)
+        _ranges = [
+            {
+                "area_name_en": row["area_name_en"],
+                "median_procedure_area": float(row["median_procedure_area"]),
+                "min": float(row["min"]),
+                "max": float(row["max"]),
+            }
+            for _, row in df.iterrows()
+        ]
+    return _ranges
+
+
+def _records(df):
+    # NaN is not valid JSON
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _number(value):
+    # NaN is not valid JSON
+    return None if math.isnan(value) else value
+
+
+def _error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _invalid_input(input_data):
+    # Message for an input the encoder cannot take, or None when it is usable
+    if not isinstance(input_data, dict) or not isinstance(input_data.get("area_name_en"), str):
+        return "❌ Expected a JSON object with area_name_en"
+    for field, value in input_data.items():
+        if isinstance(value, (list, dict)):
+            return f"❌ {field} must be a single value"
+    return None
+
+
+def _invalid_axes(axes):
+    # Same for the axes of a sweep: field names, or {field: [single values]}
+    if isinstance(axes, list) and all(isinstance(field, str) for field in axes):
+        return None
+    if isinstance(axes, dict) and all(isinstance(vals, list) and not any(isinstance(v, (list, dict)) for v in vals)
+                                      for vals in axes.values()):
+        return None
+    return "❌ axes must be a list of field names or {field: [single values, ...]}"
+
+
+# -----------------------------------------------------
+# 2. Endpoints
+# -----------------------------------------------------
+async def health(request):
+    registry = get_registry()
+    store = get_data_store()
+    return JSONResponse({
+        "status": "ok",
+        "model_version": registry.model_version,
+        "areas": len(registry.index),
+        "registry": registry.stats(),
+        "forecast_sha256": store.forecast_sha256,
+        "history_sha256": store.history_sha256,
+        "price_cube": get_price_cube(registry) is not None,
+        "batcher": _batcher.stats() if _batcher is not None else None,
+    })
+
+
+async def version(request):
+    store = get_data_store()
+    return JSONResponse({
+        "model_version": get_registry().model_version,
+        "forecast_sha256": store.forecast_sha256,
+        "history_sha256": store.history_sha256,
+    })
+
+
+async def areas(request):
+    return JSONResponse({"areas": load_ranges()})
+
+
+async def predict(request):
+    try:
+        input_data = await request.json()
+    except ValueError:
+        return _error(400, "❌ Request body must be JSON")
+    invalid = _invalid_input(input_data)
+    if invalid:
+        return _error(422, invalid)
+
+    # CPU-bound work goes to the thread pool so the event loop keeps serving;
+    # with batching on, concurrent requests for one area share a single call.
+    # The bounds come out of the same broadcast, ?bands=1 returns them.
+    try:
+        if _batcher is not None:
+            months, paths, messages = await _batcher.submit(input_data)
+        else:
+            months, paths, messages = await run_in_threadpool(predict_series, input_data, True)
+    except Overloaded as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+    except (TypeError, ValueError) as e:
+        # Only this request's input failed; the batcher isolates it from the rest
+        return _error(422, f"❌ Input could not be priced: {e}")
+    errors = [message for level, message in messages if level == "error"]
+    warnings = [message for level, message in messages if level != "error"]
+    if months is None:
+        return _error(404, errors[0] if errors else "❌ Prediction failed")
+    lower, prices, upper = paths.tolist()
+    if request.query_params.get("bands") in ("1", "true"):
+        rows = [{"month": month, "median_price": _number(price),
+                 "lower_price": _number(low), "upper_price": _number(high)}
+                for month, price, low, high in zip(months.tolist(), prices, lower, upper)]
+    else:
+        rows = [{"month": month, "median_price": _number(price)} for month, price in zip(months.tolist(), prices)]
+    return JSONResponse({
+        "area_name_en": input_data["area_name_en"],
+        "rows": rows,
+        "warnings": warnings,
+    })
+
+
+async def predict_batch(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "❌ Request body must be JSON")
+    inputs = body.get("inputs") if isinstance(body, dict) else body
+    if not isinstance(inputs, list):
+        return _error(422, "❌ Expected {\"inputs\": [...]} with area_name_en in every input")
+    if len(inputs) > MAX_BATCH:
+        return _error(413, f"❌ At most {MAX_BATCH} inputs per batch")
+    for row, input_data in enumerate(inputs):
+        invalid = _invalid_input(input_data)
+        if invalid:
+            return _error(422, f"{invalid} (input {row})")
+    if not inputs:
+        return JSONResponse({"rows": []})
+
+    result = await run_in_threadpool(predict_many, inputs)
+    return JSONResponse({"rows": _records(result)})
+
+
+async def sweep(request):
+    # {"input": {...}, "axes": ["procedure_area"] or {"rooms_en": [...]}, "points": 50}
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "❌ Request body must be JSON")
+    if not isinstance(body, dict) or not isinstance(body.get("input"), dict) \
+            or not isinstance(body["input"].get("area_name_en"), str) or not isinstance(body.get("axes"), (list, dict)):
+        return _error(422, "❌ Expected {\"input\": {...}, \"axes\": [...]} with area_name_en in the input")
+    invalid = _invalid_input(body["input"])
+    if invalid:
+        return _error(422, invalid)
+    axes, points = body["axes"], body.get("points", SWEEP_POINTS)
+    if isinstance(points, bool) or not isinstance(points, int):
+        return _error(422, "❌ points must be an integer")
+    invalid = _invalid_axes(axes)
+    if invalid:
+        return _error(422, invalid)
+    try:
+        result = await run_in_threadpool(predict_sweep, body["input"], axes, points)
+    except ValueError as e:
+        return _error(422, str(e))
+    return JSONResponse({"rows": _records(result)})
+
+
+async def metrics(request):
+    # Prometheus text by default, ?format=json for the same numbers as JSON
+    if request.query_params.get("format") == "json":
+        return JSONResponse({"stages": stage_metrics.snapshot(),
+                             "batcher": _batcher.stats() if _batcher is not None else None})
+    text = stage_metrics.prometheus() + (_batcher.prometheus() if _batcher is not None else "")
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+async def profile(request):
+    # Samples every thread's stack for ?seconds=N and returns collapsed stacks
+    try:
+        seconds = min(float(request.query_params.get("seconds", "5")), MAX_PROFILE_SECONDS)
+    except ValueError:
+        return _error(422, "❌ seconds must be a number")
+    profiler = SamplingProfiler().start()
+    await asyncio.sleep(seconds)
+    return PlainTextResponse(profiler.stop().collapsed())
+
+
+# -----------------------------------------------------
+# 3. App
+# -----------------------------------------------------
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Everything a request needs is made resident before the first request
+    def warm():
+        registry = get_registry()
+        registry.preload()
+        get_smoothing_cache().warm()
+        get_price_cube(registry)
+        load_ranges()
+
+    global _batcher
+    await run_in_threadpool(warm)
+    if BATCH_WINDOW_MS > 0:
+        _batcher = MicroBatcher(functools.partial(predict_series_many, bands=True))
+    yield
+    if _batcher is not None:
+        await _batcher.drain()
+        _batcher = None
+
+
+routes = [
+    Route("/health", health),
+    Route("/version", version),
+    Route("/areas", areas),
+    Route("/metrics", metrics),
+    Route("/predict", predict, methods=["POST"]),
+    Route("/predict/batch", predict_batch, methods=["POST"]),
+    Route("/predict/sweep", sweep, methods=["POST"]),
+]
+if DEBUG_PROFILE:
+    routes.append(Route("/debug/profile", profile))
+
+app = Starlette(routes=routes, lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve predict_with_area over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    uvicorn.run("prediction_service:app", host=args.host, port=args.port, workers=args.workers)
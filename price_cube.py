@@ -0,0 +1,282 @@
+import argparse
+import json
+import mmap
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from instrumentation import timed
+from model_bundle import PREAMBLE, _pad
+from tree_engine import LEAF
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PRICE_CUBE_PATH = os.path.join(BASE_DIR, "price_cube.bin")
+
+# Same layout as the model bundle: preamble, JSON header (model version, axes,
+# array offsets/dtypes), then every area's arrays on ALIGN boundaries, so a
+# load maps the file instead of reading a private copy into each worker.
+CUBE_MAGIC = b"DTCUBE\0\0"
+CUBE_FORMAT_VERSION = 1
+CUBE_ARRAYS = ("offsets", "breaks", "values", "levels")
+
+CONTINUOUS_FIELD = "procedure_area"
+
+
+# -----------------------------------------------------
+# 2. Per-Area Cube
+# -----------------------------------------------------
+#
+# Every input except procedure_area is categorical: rooms_en / floor_bin take
+# one of the trained categories (or "other", which encodes to all zeros just
+# like an unseen category) and the remaining numeric columns are 0/1 flags.
+# Each combination of those is one cell of an N-dimensional grid. For a fixed
+# cell the tree is a step function of procedure_area whose steps sit exactly
+# on the tree's split points, so a cell stores those breakpoints and the leaf
+# value of each step. A lookup is a grid index plus a search over the cell's
+# breakpoints and returns the exact tree output.
+#
+# Breakpoints are stored as the largest float32 not above the split point:
+# inputs are float32 by the time the tree sees them, so `x <= split` and
+# `x <= floor32(split)` agree for every input. Step values are codes into the
+# area's distinct leaf values (`levels`).
+
+def floor_float32(values):
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+class AreaCube:
+    __slots__ = ("axes", "shape", "strides", "continuous", "offsets", "breaks", "values", "levels")
+
+    def __init__(self, axes, offsets, breaks, values, levels, continuous):
+        # axes: [(field, kind, categories)] with kind "category" or "flag"
+        self.axes = axes
+        self.shape = tuple(len(cats) + 1 if kind == "category" else 2 for _, kind, cats in axes)
+        self.strides = tuple(int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape)))
+        self.continuous = continuous
+        self.offsets = offsets
+        self.breaks = breaks
+        self.values = values
+        self.levels = levels
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.breaks.nbytes + self.values.nbytes + self.levels.nbytes
+
+    def cell(self, input_data):
+        index = 0
+        for (field, kind, categories), stride in zip(self.axes, self.strides):
+            value = input_data.get(field)
+            if kind == "category":
+                pos = categories.index(value) if value in categories else len(categories)
+            elif value is None or value == 0:
+                pos = 0
+            elif value == 1:
+                pos = 1
+            else:
+                return None
+            index += pos * stride
+        return index
+
+    def lookup(self, input_data):
+        # Returns None when an input falls outside the grid (non 0/1 flag,
+        # non-numeric or non-scalar procedure_area); callers fall back to the tree.
+        index = self.cell(input_data)
+        if index is None:
+            return None
+        x = np.float32(0.0)
+        if self.continuous:
+            value = input_data.get(CONTINUOUS_FIELD)
+            try:
+                x = np.float32(0.0 if value is None else value)
+                # A list gives an array, NaN is not on the grid
+                if x.ndim or x != x:
+                    return None
+            except (TypeError, ValueError):
+                return None
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        step = start + int(np.searchsorted(self.breaks[start:stop], x, side="left"))
+        return float(self.levels[self.values[step]])
+
+
+def build_area_cube(encoder, tree):
+    axes = [(field, "category", sorted(index)) for field, index in encoder.categories.items() if index]
+    axes += [(field, "flag", None) for field in encoder.numeric if field != CONTINUOUS_FIELD]
+    continuous = encoder.numeric.get(CONTINUOUS_FIELD)
+
+    feature = np.asarray(tree.feature)
+    threshold = np.asarray(tree.threshold, dtype=np.float64)
+    left = np.asarray(tree.left)
+    right = np.asarray(tree.right)
+    value = np.asarray(tree.value, dtype=np.float64)
+
+    shape = tuple(len(cats) + 1 if kind == "category" else 2 for _, kind, cats in axes)
+    n_cells = int(np.prod(shape))
+    offsets = np.zeros(n_cells + 1, dtype=np.int64)
+    breaks, values = [], []
+
+    for cell, positions in enumerate(np.ndindex(*shape) if shape else [()]):
+        fixed = np.zeros(encoder.n_features, dtype=np.float32)
+        for (field, kind, categories), pos in zip(axes, positions):
+            if kind == "category":
+                if pos < len(categories):
+                    fixed[encoder.categories[field][categories[pos]]] = 1.0
+            else:
+                fixed[encoder.numeric[field]] = pos
+
+        # Walk the tree with the categorical inputs fixed, splitting the
+        # procedure_area interval (lo, hi] at every split on it; left-first
+        # order yields the steps in ascending order.
+        cell_breaks, cell_values = [], []
+        stack = [(0, -np.inf, np.inf)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if left[node] == LEAF:
+                if cell_values and cell_values[-1] == value[node]:
+                    cell_breaks[-1] = hi
+                else:
+                    cell_breaks.append(hi)
+                    cell_values.append(value[node])
+                continue
+            t = threshold[node]
+            if feature[node] == continuous:
+                if t < hi:
+                    stack.append((right[node], max(lo, t), hi))
+                if lo < t:
+                    stack.append((left[node], lo, min(hi, t)))
+            elif fixed[feature[node]] <= t:
+                stack.append((left[node], lo, hi))
+            else:
+                stack.append((right[node], lo, hi))
+
+        breaks.extend(cell_breaks)
+        values.extend(cell_values)
+        offsets[cell + 1] = len(values)
+
+    levels, codes = np.unique(np.array(values), return_inverse=True)
+    code_dtype = np.uint16 if len(levels) <= np.iinfo(np.uint16).max else np.uint32
+    return AreaCube(axes, offsets, floor_float32(breaks), codes.astype(code_dtype), levels, continuous is not None)
+
+
+# -----------------------------------------------------
+# 3. Save / Load
+# -----------------------------------------------------
+class PriceCube:
+    def __init__(self, model_version, cubes):
+        self.model_version = model_version
+        self.cubes = cubes
+
+    def lookup(self, area_key, input_data):
+        cube = self.cubes.get(area_key)
+        return None if cube is None else cube.lookup(input_data)
+
+    def save(self, path=PRICE_CUBE_PATH):
+        header = {"format_version": CUBE_FORMAT_VERSION, "model_version": self.model_version, "areas": {}}
+        payload = []
+        offset = 0
+        for key, cube in sorted(self.cubes.items()):
+            arrays = {}
+            for name in CUBE_ARRAYS:
+                data = np.ascontiguousarray(getattr(cube, name))
+                arrays[name] = {"offset": offset, "dtype": data.dtype.str, "count": len(data)}
+                raw = data.tobytes()
+                payload.append(raw + b"\0" * _pad(len(raw)))
+                offset += len(raw) + _pad(len(raw))
+            header["areas"][key] = {"axes": cube.axes, "continuous": cube.continuous, "arrays": arrays}
+        header["payload_bytes"] = offset
+        raw_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        raw_header += b" " * _pad(PREAMBLE.size + len(raw_header))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(PREAMBLE.pack(CUBE_MAGIC, CUBE_FORMAT_VERSION, len(raw_header)))
+            file.write(raw_header)
+            file.writelines(payload)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    @timed("price_cube_load")
+    def load(cls, path=PRICE_CUBE_PATH):
+        # The arrays are read-only views into one shared mapping of the file
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(data) < PREAMBLE.size:
+            raise ValueError(f"❌ Truncated price cube: {path}")
+        magic, version, header_len = PREAMBLE.unpack_from(data, 0)
+        if magic != CUBE_MAGIC or version != CUBE_FORMAT_VERSION:
+            raise ValueError(f"❌ Not a price cube (format {CUBE_FORMAT_VERSION}): {path}")
+        header = json.loads(bytes(data[PREAMBLE.size:PREAMBLE.size + header_len]))
+        payload_start = PREAMBLE.size + header_len
+        if len(data) - payload_start != header["payload_bytes"]:
+            raise ValueError(f"❌ Truncated price cube: {path}")
+
+        cubes = {}
+        for key, spec in header["areas"].items():
+            arrays = {name: np.frombuffer(data, dtype=a["dtype"], count=a["count"], offset=payload_start + a["offset"])
+                      for name, a in spec["arrays"].items()}
+            axes = [tuple(axis) for axis in spec["axes"]]
+            cubes[key] = AreaCube(axes, arrays["offsets"], arrays["breaks"], arrays["values"], arrays["levels"],
+                                  spec["continuous"])
+        return cls(header["model_version"], cubes)
+
+
+def build_price_cube(registry):
+    cubes = {}
+    for key in sorted(registry.index):
+        entry = registry.get(key)
+        cubes[key] = build_area_cube(entry.encoder, entry.tree)
+    return PriceCube(registry.model_version, cubes)
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_cube = None
+_cube_checked = False
+_cube_lock = threading.Lock()
+
+
+def get_price_cube(registry):
+    # The cube is served only when it was built from the models being served
+    global _cube, _cube_checked
+    if not _cube_checked:
+        with _cube_lock:
+            if not _cube_checked:
+                if os.path.exists(PRICE_CUBE_PATH):
+                    try:
+                        cube = PriceCube.load(PRICE_CUBE_PATH)
+                    except (OSError, ValueError, KeyError) as e:
+                        # Predictions fall back to the trees
+                        warnings.warn(f"⚠️ Ignoring price cube {PRICE_CUBE_PATH}: {e}")
+                        cube = None
+                    if cube is not None and cube.model_version == registry.model_version:
+                        _cube = cube
+                _cube_checked = True
+    return _cube
+
+
+if __name__ == "__main__":
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Precompute every area's tree over the full input grid.")
+    parser.add_argument("--out", default=PRICE_CUBE_PATH)
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    start = time.perf_counter()
+    cube = build_price_cube(registry)
+    cube.save(args.out)
+    for key, area_cube in sorted(cube.cubes.items()):
+        print(f"✅ {registry.index[key][0]}: {len(area_cube.offsets) - 1} cells, "
+              f"{len(area_cube.values)} steps, {area_cube.nbytes / 1e6:.2f} MB")
+    print(f"Model version {cube.model_version}, built in {time.perf_counter() - start:.1f}s")
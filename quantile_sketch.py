@@ -0,0 +1,199 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+
+SKETCH_K = 200
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+# -----------------------------------------------------
+# 2. KLL Sketch
+# -----------------------------------------------------
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Values are kept in levels; an item on level h stands for 2**h inputs.
+    When a level outgrows its capacity it is sorted and every other item
+    moves up a level. Memory stays around 3k items however many values are
+    added, and the rank error of a quantile is about 1.7/k (~1% for k=200).
+
+    Until the first compaction the sketch holds every value and quantiles
+    are exact, interpolated like pandas' median, so small buckets give the
+    same numbers as the exact aggregation.
+    """
+
+    __slots__ = ("k", "n", "levels")
+
+    def __init__(self, k=SKETCH_K):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def _capacity(self, h):
+        return max(2, math.ceil(self.k * (2.0 / 3.0) ** (len(self.levels) - 1 - h)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values]) if self.n else values
+            self.n += len(values)
+            if not self.exact or self.n > self.k:
+                self._compress()
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError(f"❌ Cannot merge sketches with k={self.k} and k={other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            h = next((h for h, level in enumerate(self.levels) if len(level) > self._capacity(h)), None)
+            if h is None:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            level = np.sort(self.levels[h])
+            odd = len(level) % 2
+            # Which half survives is a coin flip; seeding it from the state
+            # keeps a given stream of updates reproducible.
+            offset = int(np.random.default_rng((self.n, h, len(level))).integers(2))
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], level[odd + offset::2]])
+            self.levels[h] = level[:odd]
+
+    def quantile(self, q):
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            out = np.full(len(qs), np.nan)
+        elif self.exact:
+            out = np.quantile(self.levels[0], qs)
+            out[qs == 0.5] = np.median(self.levels[0])
+        else:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            items, cum = items[order], np.cumsum(weights[order])
+            out = items[np.minimum(np.searchsorted(cum, qs * cum[-1], side="left"), len(items) - 1)]
+        return out if np.ndim(q) else float(out[0])
+
+    # ---- serialisation: header [k, n, levels, len_0, ...] then the items ----
+    def to_bytes(self):
+        header = np.array([self.k, self.n, len(self.levels)] + [len(level) for level in self.levels], dtype=np.int64)
+        return header.tobytes() + np.concatenate(self.levels).tobytes()
+
+    @classmethod
+    def from_bytes(cls, raw):
+        k, n, n_levels = np.frombuffer(raw, dtype=np.int64, count=3)
+        lengths = np.frombuffer(raw, dtype=np.int64, count=n_levels, offset=24)
+        items = np.frombuffer(raw, dtype=np.float64, offset=24 + 8 * int(n_levels))
+        sketch = cls(int(k))
+        sketch.n = int(n)
+        sketch.levels = [level.copy() for level in np.split(items, np.cumsum(lengths)[:-1])]
+        return sketch
+
+
+def sketch_groups(df, keys, value, sketches=None, k=SKETCH_K):
+    """Streams one chunk of rows into per-group sketches ({group key: KLLSketch})."""
+    sketches = {} if sketches is None else sketches
+    grouped = df.groupby(keys, sort=False, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")
+    values = df[value].to_numpy(dtype=np.float64)[order]
+    bounds = np.searchsorted(codes[order], np.arange(grouped.ngroups + 1))
+    for group, start, stop in zip(grouped.size().index.tolist(), bounds[:-1], bounds[1:]):
+        sketch = sketches.get(group)
+        if sketch is None:
+            sketch = sketches[group] = KLLSketch(k)
+        sketch.update(values[start:stop])
+    return sketches
+
+
+def _lerp(a, b, t):
+    # numpy's interpolation, so exact quantiles match np.quantile bit for bit
+    return np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+
+
+def quantiles(sketches, qs=QUANTILES):
+    """Quantiles of many sketches at once, an (n_sketches, len(qs)) array.
+
+    Sketches that still hold every value (most buckets of a fine grouping)
+    are answered together with one sort instead of one call each.
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    out = np.full((len(sketches), len(qs)), np.nan)
+    exact = [i for i, sketch in enumerate(sketches) if sketch.exact and sketch.n]
+    for i, sketch in enumerate(sketches):
+        if not sketch.exact:
+            out[i] = sketch.quantile(qs)
+    if not exact:
+        return out
+
+    counts = np.array([sketches[i].n for i in exact])
+    values = np.concatenate([sketches[i].levels[0] for i in exact])
+    group = np.repeat(np.arange(len(exact)), counts)
+    values = values[np.lexsort((values, group))]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    for j, q in enumerate(qs):
+        pos = q * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, counts - 1)
+        a, b = values[starts + lo], values[starts + hi]
+        if q == 0.5:
+            # np.median averages the two middle values
+            out[exact, j] = np.where(counts % 2, values[starts + (counts - 1) // 2], (a + b) / 2)
+        else:
+            out[exact, j] = _lerp(a, b, pos - lo)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check KLL sketch accuracy against exact quantiles.")
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=SKETCH_K)
+    parser.add_argument("--parts", type=int, default=8, help="sketch this many partitions and merge them")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(9.5, 0.4, args.n)
+    start = time.perf_counter()
+    sketches = [KLLSketch(args.k) for _ in range(args.parts)]
+    for part, chunk in enumerate(np.array_split(values, args.parts * 50)):
+        sketches[part % args.parts].update(chunk)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    elapsed = time.perf_counter() - start
+
+    ordered = np.sort(values)
+    for q, estimate in zip(QUANTILES, merged.quantile(QUANTILES)):
+        rank = np.searchsorted(ordered, estimate) / args.n
+        print(f"p{int(q * 100):<3} exact {np.quantile(values, q):10.2f}  sketch {estimate:10.2f}  "
+              f"rank error {abs(rank - q):.4f}")
+    print(f"{args.n} values, {sum(len(level) for level in merged.levels)} items kept "
+          f"({merged.nbytes / 1e3:.1f} kB), {elapsed:.2f}s")
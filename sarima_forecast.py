@@ -0,0 +1,201 @@
+import argparse
+import itertools
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------
+# 1. FILES + SEARCH SPACE
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.path.join(BASE_DIR, "historical_data.csv")
+FORECAST_PATH = os.path.join(BASE_DIR, "Sarima_forecast_6M.csv")
+PARAMS_PATH = os.path.join(BASE_DIR, "sarima_params.json")
+
+STEPS = 6
+ALPHA = 0.05
+ORDERS = [(p, d, q) for p, d, q in itertools.product([0, 1, 2], [1], [0, 1, 2])]
+SEASONAL_ORDERS = [(0, 0, 0, 0), (1, 0, 0, 12), (0, 1, 1, 12)]
+
+FORECAST_COLUMNS = ["month", "area_name_en", "yhat", "yhat_lower", "yhat_upper",
+                    "growth_factor", "growth_factor_lower", "growth_factor_upper"]
+
+
+def load_series(path=HISTORY_PATH):
+    return split_series(pd.read_csv(path))
+
+
+def split_series(df):
+    # One month-start indexed series per area; missing months are interpolated
+    df = df.assign(year_month=pd.to_datetime(df["year_month"]))
+    series = {}
+    for area, group in df.groupby("area_name_en"):
+        s = group.set_index("year_month")["meter_sale_price"].sort_index()
+        s = s[~s.index.duplicated(keep="last")].asfreq("MS").interpolate()
+        series[area] = s
+    return series
+
+
+# -----------------------------------------------------
+# 2. Per-Area Fit (runs in worker processes)
+# -----------------------------------------------------
+def _fit(y, order, seasonal_order, start_params=None):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(y, order=order, seasonal_order=seasonal_order,
+                    enforce_stationarity=False, enforce_invertibility=False)
+    return model.fit(start_params=start_params, disp=False)
+
+
+def fit_area(area, months, values, cached=None, steps=STEPS, alpha=ALPHA):
+    warnings.simplefilter("ignore")
+    start = time.perf_counter()
+    y = np.asarray(values, dtype=np.float64)
+
+    # Warm start: reuse last run's order and parameters instead of searching
+    result = None
+    if cached is not None:
+        try:
+            result = _fit(y, tuple(cached["order"]), tuple(cached["seasonal_order"]),
+                          np.asarray(cached["params"]))
+        except (ValueError, np.linalg.LinAlgError):
+            result = None
+
+    searched = result is None
+    if searched:
+        best_aic = np.inf
+        for order, seasonal_order in itertools.product(ORDERS, SEASONAL_ORDERS):
+            if seasonal_order[3] and len(y) < 3 * seasonal_order[3]:
+                continue
+            try:
+                candidate = _fit(y, order, seasonal_order)
+            except (ValueError, np.linalg.LinAlgError):
+                continue
+            if np.isfinite(candidate.aic) and candidate.aic < best_aic:
+                best_aic, result = candidate.aic, candidate
+        if result is None:
+            raise RuntimeError(f"❌ No SARIMA order could be fitted for area '{area}'")
+
+    forecast = result.get_forecast(steps=steps)
+    yhat = np.asarray(forecast.predicted_mean)
+    bounds = np.asarray(forecast.conf_int(alpha=alpha))
+
+    # Growth factors are relative to the model's fitted level at the last
+    # observed month, so predict_with_area can scale any base price by them.
+    base = float(np.asarray(result.fittedvalues)[-1])
+    last = pd.Timestamp(months[-1])
+    forecast_months = pd.date_range(last + pd.offsets.MonthBegin(1), periods=steps, freq="MS")
+
+    rows = pd.DataFrame({
+        "month": forecast_months.strftime("%Y-%m-%d"),
+        "area_name_en": area,
+        "yhat": yhat,
+        "yhat_lower": bounds[:, 0],
+        "yhat_upper": bounds[:, 1],
+        "growth_factor": yhat / base,
+        "growth_factor_lower": bounds[:, 0] / base,
+        "growth_factor_upper": bounds[:, 1] / base,
+    })
+    params = {
+        "order": list(result.model.order),
+        "seasonal_order": list(result.model.seasonal_order),
+        "params": np.asarray(result.params).tolist(),
+        "aic": float(result.aic),
+        "last_month": last.strftime("%Y-%m-%d"),
+        "fit_seconds": time.perf_counter() - start,
+        "searched": searched,
+    }
+    return area, rows, params
+
+
+# -----------------------------------------------------
+# 3. Pipeline
+# -----------------------------------------------------
+def _write_atomic(df, path):
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_params(path=PARAMS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def reforecast(history_path=HISTORY_PATH, forecast_path=FORECAST_PATH, params_path=PARAMS_PATH,
+               areas=None, full_search=False, workers=None, steps=STEPS, series=None):
+    if series is None:
+        series = load_series(history_path)
+    if areas:
+        series = {area: s for area, s in series.items() if area in areas}
+    cache = {} if full_search else load_params(params_path)
+
+    results, fitted, failed = [], {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fit_area, area, s.index.strftime("%Y-%m-%d").tolist(), s.to_numpy(),
+                        cache.get(area), steps): area
+            for area, s in series.items()
+        }
+        for future, area in futures.items():
+            try:
+                _, rows, area_params = future.result()
+            except Exception as e:
+                failed[area] = str(e)
+                continue
+            results.append(rows)
+            fitted[area] = area_params
+
+    if not results:
+        raise RuntimeError(f"❌ No area could be forecast: {failed}")
+
+    # Areas that were not refit (not in the history, filtered out or failed)
+    # keep their previous forecast rows.
+    new = pd.concat(results, ignore_index=True)
+    if os.path.exists(forecast_path):
+        old = pd.read_csv(forecast_path, index_col=0)
+        new = pd.concat([new, old[~old["area_name_en"].isin(new["area_name_en"])]], ignore_index=True)
+    new = new.sort_values(["area_name_en", "month"], kind="stable").reset_index(drop=True)[FORECAST_COLUMNS]
+
+    _write_atomic(new, forecast_path)
+    params = load_params(params_path)
+    params.update(fitted)
+    tmp_path = f"{params_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(params, file, indent=1)
+    os.replace(tmp_path, params_path)
+    return new, fitted, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refit per-area SARIMA models and rewrite Sarima_forecast_6M.csv.")
+    parser.add_argument("--areas", nargs="*", help="only refit these areas")
+    parser.add_argument("--full-search", action="store_true", help="ignore cached orders and search again")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--out", default=FORECAST_PATH)
+    args = parser.parse_args()
+
+    # Once monthly_store.py has been seeded it, not historical_data.csv, is current
+    from monthly_store import MonthlyStore
+
+    history_store = MonthlyStore()
+    start = time.perf_counter()
+    forecast, fitted, failed = reforecast(forecast_path=args.out, areas=args.areas,
+                                          full_search=args.full_search, workers=args.workers, steps=args.steps,
+                                          series=history_store.series() if history_store.exists() else None)
+    for area, p in sorted(fitted.items()):
+        mode = "searched" if p["searched"] else "warm start"
+        print(f"✅ {area}: SARIMA{tuple(p['order'])}x{tuple(p['seasonal_order'])} "
+              f"AIC {p['aic']:.1f}, {p['fit_seconds']:.1f}s ({mode})")
+    for area, error in failed.items():
+        print(f"❌ {area}: {error}")
+    print(f"Wrote {len(forecast)} rows to {args.out} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from data_store import HISTORY_PATH, get_data_store
+from instrumentation import span
+from model_registry import area_key
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+
+LOWESS_FRAC = 0.04
+CACHE_PATH = os.path.splitext(HISTORY_PATH)[0] + ".smoothed.npz"
+
+
+# -----------------------------------------------------
+# 2. Smoother Backends
+# -----------------------------------------------------
+#
+# Every backend smooths an evenly spaced monthly series: smoother(y, frac)
+# returns an array like y. "lowess" is statsmodels and the reference; the
+# others trade exactness for speed on long series (see bench_smoothers.py).
+
+def _neighbours(n, frac):
+    # Same neighbourhood size statsmodels uses
+    return min(max(int(frac * n + 1e-10), 2), n)
+
+
+def lowess_smoother(y, frac):
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+
+    return lowess(endog=y, exog=np.arange(len(y)), frac=frac)[:, 1]
+
+
+def _local_linear_weights(n, k, rows):
+    # Windows and tricube weights statsmodels picks for x = 0..n-1: the window
+    # of k points slides right until x_i is at (or just left of) its centre.
+    left = np.clip(np.ceil(rows - k / 2.0).astype(np.int64), 0, n - k)
+    window = left[:, None] + np.arange(k)[None, :]
+    radius = np.maximum(rows - left, left + k - 1 - rows).astype(np.float64)
+    dist = np.abs(window - rows[:, None]) / radius[:, None]
+    return window, (1.0 - dist ** 3) ** 3
+
+
+def _local_linear_fit(y, rows, window, weights):
+    x = window.astype(np.float64)
+    xval = rows.astype(np.float64)
+    ok = (weights > 1e-12).sum(axis=1) >= 2
+
+    w = weights / np.where(ok, weights.sum(axis=1), 1.0)[:, None]
+    mean_x = (w * x).sum(axis=1)
+    sqdev = np.maximum((w * (x - mean_x[:, None]) ** 2).sum(axis=1), 1e-12)
+    p = w * (1.0 + (xval - mean_x)[:, None] * (x - mean_x[:, None]) / sqdev[:, None])
+    return np.where(ok, (p * y[window]).sum(axis=1), y[rows])
+
+
+def windowed_smoother(y, frac, it=3):
+    # Vectorised LOWESS: all local regressions of one pass as (n, k) array
+    # operations, including the bisquare robustness passes. Matches
+    # statsmodels to rounding error.
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < 2:
+        return y.copy()
+    rows = np.arange(n)
+    window, tricube = _local_linear_weights(n, _neighbours(n, frac), rows)
+
+    robust = np.ones(n)
+    for _ in range(it + 1):
+        fit = _local_linear_fit(y, rows, window, tricube * robust[window])
+        resid = np.abs(y - fit)
+        median = np.median(resid)
+        scaled = (resid > 0).astype(np.float64) if median == 0 else np.minimum(resid / (6.0 * median), 1.0)
+        robust = (1.0 - scaled ** 2) ** 2
+    return fit
+
+
+def kernel_smoother(y, frac):
+    # LOWESS without robustness passes. Away from the edges every local
+    # regression is the same linear filter, so the interior is one
+    # convolution; only the first and last k points are fitted one by one.
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < 2:
+        return y.copy()
+    k = _neighbours(n, frac)
+    if n <= 2 * k:
+        rows = np.arange(n)
+        return _local_linear_fit(y, rows, *_local_linear_weights(n, k, rows))
+
+    out = np.empty(n)
+    edges = np.concatenate([np.arange(k), np.arange(n - k, n)])
+    out[edges] = _local_linear_fit(y, edges, *_local_linear_weights(n, k, edges))
+
+    # Projection weights of one interior regression, applied as a filter
+    centre = np.array([n // 2])
+    window, tricube = _local_linear_weights(n, k, centre)
+    kernel = np.array([_local_linear_fit(np.eye(k)[j], np.array([centre[0] - window[0, 0]]),
+                                         np.arange(k)[None, :], tricube)[0] for j in range(k)])
+    offset = window[0, 0] - centre[0]
+    out[k:n - k] = np.convolve(y, kernel[::-1], mode="valid")[k + offset:n - k + offset]
+    return out
+
+
+def ewm_smoother(y, frac):
+    # Zero-phase exponentially weighted mean (forward and backward pass
+    # averaged) with a span equal to the LOWESS neighbourhood size.
+    from scipy.signal import lfilter
+
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) < 2:
+        return y.copy()
+    alpha = 2.0 / (_neighbours(len(y), frac) + 1.0)
+    forward = lfilter([alpha], [1.0, alpha - 1.0], y, zi=[y[0] * (1.0 - alpha)])[0]
+    backward = lfilter([alpha], [1.0, alpha - 1.0], y[::-1], zi=[y[-1] * (1.0 - alpha)])[0][::-1]
+    return (forward + backward) / 2.0
+
+
+def savgol_smoother(y, frac, polyorder=1):
+    # Savitzky-Golay: least-squares polynomial over a fixed odd window
+    from scipy.signal import savgol_filter
+
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    window = _neighbours(n, frac) | 1
+    if window <= polyorder or window > n:
+        return y.copy()
+    return savgol_filter(y, window_length=window, polyorder=polyorder, mode="interp")
+
+
+SMOOTHERS = {
+    "lowess": lowess_smoother,
+    "windowed": windowed_smoother,
+    "kernel": kernel_smoother,
+    "ewm": ewm_smoother,
+    "savgol": savgol_smoother,
+}
+DEFAULT_SMOOTHER = "lowess"
+
+
+def register_smoother(name, smoother):
+    SMOOTHERS[name] = smoother
+
+
+def smooth(y, frac=LOWESS_FRAC, method=DEFAULT_SMOOTHER):
+    if method not in SMOOTHERS:
+        raise ValueError(f"❌ Unknown smoother '{method}', expected one of {sorted(SMOOTHERS)}")
+    return SMOOTHERS[method](y, frac)
+
+
+# -----------------------------------------------------
+# 3. Smoothed History Cache
+# -----------------------------------------------------
+class SmoothingCache:
+    """Smoothed history per (smoother, area, frac), computed once.
+
+    Every entry remembers the digest of the area history it was computed
+    from and is recomputed when that changes: a reloaded history file
+    invalidates every area, an incremental ingest only the areas it touched.
+    With ``persist`` the cache is mirrored to ``path`` next to the CSV so a
+    cold process skips the smoothing as long as the history content matches.
+    Entries restored from a ``snapshot`` (see snapshot.py) are checked the
+    same way.
+    """
+
+    def __init__(self, store, path=CACHE_PATH, persist=False, method=DEFAULT_SMOOTHER, snapshot=None):
+        if method not in SMOOTHERS:
+            raise ValueError(f"❌ Unknown smoother '{method}', expected one of {sorted(SMOOTHERS)}")
+        self.store = store
+        self.path = path
+        self.persist = persist
+        self.method = method
+        self._lock = threading.Lock()
+        self._series = self._load() if persist else {}
+        if snapshot is not None:
+            for key, entry in snapshot.smoothed().items():
+                self._series.setdefault(key, entry)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, area_name_en, frac=LOWESS_FRAC, method=None):
+        history = self.store.get_history(area_name_en)
+        if history is None:
+            return None
+
+        key = (method or self.method, area_key(area_name_en), float(frac))
+        with self._lock:
+            digest, smoothed = self._series.get(key, (None, None))
+            if smoothed is not None and digest == history.source_sha256:
+                self.hits += 1
+                return smoothed
+
+            self.misses += 1
+            with span("smooth"):
+                smoothed = np.array(smooth(history.median_price, frac, key[0]), dtype=np.float64)
+            smoothed.flags.writeable = False
+            self._series[key] = (history.source_sha256, smoothed)
+            if self.persist:
+                self._save()
+            return smoothed
+
+    def warm(self, frac=LOWESS_FRAC, method=None, areas=None):
+        for key in list(self.store.history) if areas is None else areas:
+            self.get(key, frac, method)
+
+    def entries(self):
+        with self._lock:
+            return dict(self._series)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with np.load(self.path) as data:
+            if "digests" not in data.files:
+                return {}
+            digests = json.loads(str(data["digests"]))
+            series = {}
+            for name, digest in digests.items():
+                method, area, frac = name.split("|")
+                smoothed = data[name]
+                smoothed.flags.writeable = False
+                series[(method, area, float(frac))] = (digest, smoothed)
+            return series
+
+    def _save(self):
+        arrays, digests = {}, {}
+        for (method, area, frac), (digest, smoothed) in self._series.items():
+            name = f"{method}|{area}|{frac!r}"
+            arrays[name] = smoothed
+            digests[name] = digest
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, digests=np.array(json.dumps(digests)), **arrays)
+        os.replace(tmp_path, self.path)
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_smoothing_cache():
+    # LOWESS_CACHE_PERSIST=1 keeps the smoothed series on disk next to historical_df.csv,
+    # SMOOTHER picks the backend (default: statsmodels lowess)
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from snapshot import get_snapshot
+
+                _cache = SmoothingCache(
+                    get_data_store(),
+                    persist=os.environ.get("LOWESS_CACHE_PERSIST", "0") == "1",
+                    method=os.environ.get("SMOOTHER", DEFAULT_SMOOTHER),
+                    snapshot=get_snapshot(),
+                )
+    return _cache
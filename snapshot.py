@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import threading
+import time
+import warnings
+import zipfile
+
+import numpy as np
+
+from data_store import BASE_DIR, FORECAST_COLUMNS, AreaForecast, AreaHistory
+from instrumentation import timed
+from tree_engine import ARRAYS, FlatTree
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+#
+# PREDICTION_SNAPSHOT=<path> reads the snapshot from <path>, =0 turns it off
+
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "prediction_state.npz")
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_path():
+    path = os.environ.get("PREDICTION_SNAPSHOT", SNAPSHOT_PATH)
+    return None if path == "0" else path
+
+
+# -----------------------------------------------------
+# 2. Build
+# -----------------------------------------------------
+def build_snapshot(registry, store, cache, path=SNAPSHOT_PATH):
+    """Writes everything the first prediction of a process needs to one .npz.
+
+    Tree arrays and training columns per area, forecast growth factors,
+    history and its smoothed series. Each part records what it was built
+    from (model version, file digests) so a stale part is ignored on load.
+    """
+    arrays = {}
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "model_version": registry.model_version,
+        "forecast_sha256": store.forecast_sha256,
+        "history_sha256": store.history_sha256,
+        "areas": {},
+        "forecast": {},
+        "history": {},
+        "smoothed": {},
+    }
+
+    for key in sorted(registry.index):
+        entry = registry.get(key)
+        meta["areas"][key] = {"area": entry.area, "columns": list(entry.columns)}
+        for name in ARRAYS:
+            arrays[f"tree|{key}|{name}"] = np.asarray(getattr(entry.tree, name))
+
+    for key, forecast in store.forecast.items():
+        meta["forecast"][key] = forecast.area
+        arrays[f"forecast|{key}|month"] = np.asarray(forecast.month, dtype=str)
+        for col in FORECAST_COLUMNS:
+            arrays[f"forecast|{key}|{col}"] = getattr(forecast, col)
+
+    for key, history in store.history.items():
+        meta["history"][key] = {"area": history.area, "sha256": history.source_sha256}
+        arrays[f"history|{key}|month"] = np.asarray(history.month, dtype=str)
+        arrays[f"history|{key}|median_price"] = history.median_price
+
+    cache.warm()
+    for (method, key, frac), (digest, smoothed) in cache.entries().items():
+        name = f"smoothed|{method}|{key}|{frac!r}"
+        meta["smoothed"][name] = digest
+        arrays[name] = smoothed
+
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+    return meta
+
+
+# -----------------------------------------------------
+# 3. Restore
+# -----------------------------------------------------
+class Snapshot:
+    """Prepared serving state read back from one file, without pandas,
+    sklearn or statsmodels.
+
+    Read eagerly: the arrays are small next to a CSV parse or a LOWESS pass.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        with np.load(path, allow_pickle=False) as data:
+            self.meta = json.loads(str(data["meta"]))
+            if self.meta.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError(f"❌ Unsupported snapshot format in {path}")
+            self.arrays = {name: data[name] for name in data.files if name != "meta"}
+        for array in self.arrays.values():
+            array.flags.writeable = False
+
+    @property
+    def model_version(self):
+        return self.meta["model_version"]
+
+    def area(self, key, model_version):
+        # (area, columns, FlatTree) or None when built for other models
+        spec = self.meta["areas"].get(key)
+        if spec is None or model_version != self.model_version:
+            return None
+        tree = FlatTree(**{name: self.arrays[f"tree|{key}|{name}"] for name in ARRAYS})
+        return spec["area"], spec["columns"], tree
+
+    def areas(self, cls, source_sha256):
+        # The per-area split DataStore would parse from a file with this digest
+        if source_sha256 is None:
+            return None
+        if cls is AreaForecast and source_sha256 == self.meta["forecast_sha256"]:
+            return {
+                key: cls.from_arrays(area, self.arrays[f"forecast|{key}|month"].astype(object), source_sha256,
+                                     **{col: self.arrays[f"forecast|{key}|{col}"] for col in FORECAST_COLUMNS})
+                for key, area in self.meta["forecast"].items()
+            }
+        if cls is AreaHistory and source_sha256 == self.meta["history_sha256"]:
+            return {
+                key: cls.from_arrays(spec["area"], self.arrays[f"history|{key}|month"].astype(object),
+                                     spec["sha256"], self.arrays[f"history|{key}|median_price"])
+                for key, spec in self.meta["history"].items()
+            }
+        return None
+
+    def smoothed(self):
+        # {(method, area key, frac): (history digest, series)} as SmoothingCache keeps them
+        series = {}
+        for name, digest in self.meta["smoothed"].items():
+            _, method, key, frac = name.split("|")
+            series[(method, key, float(frac))] = (digest, self.arrays[name])
+        return series
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_snapshot_checked = False
+
+
+@timed("snapshot_load")
+def _open(path):
+    try:
+        return Snapshot(path)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+        # A truncated or corrupt file falls back to building the state from the sources
+        warnings.warn(f"⚠️ Ignoring prediction snapshot {path}: {e}")
+        return None
+
+
+def get_snapshot():
+    # None when there is no snapshot file (or PREDICTION_SNAPSHOT=0)
+    global _snapshot, _snapshot_checked
+    if not _snapshot_checked:
+        with _snapshot_lock:
+            if not _snapshot_checked:
+                path = snapshot_path()
+                if path and os.path.exists(path):
+                    _snapshot = _open(path)
+                _snapshot_checked = True
+    return _snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot the prepared prediction state for fast cold starts.")
+    parser.add_argument("--out", default=snapshot_path() or SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    from data_store import get_data_store
+    from model_registry import get_registry
+    from smoothing import get_smoothing_cache
+
+    start = time.perf_counter()
+    os.environ["PREDICTION_SNAPSHOT"] = "0"  # build from the sources, not an older snapshot
+    meta = build_snapshot(get_registry(), get_data_store(), get_smoothing_cache(), args.out)
+    print(f"✅ {len(meta['areas'])} areas, {len(meta['smoothed'])} smoothed series, "
+          f"{os.path.getsize(args.out) / 1e6:.2f} MB, built in {time.perf_counter() - start:.1f}s")
@@ -1,20 +1,30 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-from model_testing1 import predict_with_area  # replace file name
+
+# Client mode: with PREDICTION_SERVICE_URL set, predictions come from prediction_service.py
+if os.environ.get("PREDICTION_SERVICE_URL"):
+    from prediction_client import predict_with_area, sweep_with_area
+else:
+    from model_testing1 import predict_with_area, sweep_with_area  # replace file name
+from smoothing import smooth
+from trend_cube import get_trend_cube
 
 # ---------------------------------------------------
 # LOAD RANGE FILE
 # ---------------------------------------------------
-range_df = pd.read_csv("column_input_ranges.csv")
+@st.cache_data
+def load_range_df():
+    return pd.read_csv("column_input_ranges.csv")
+
+range_df = load_range_df()
 
 # AREA LIST
 area_list = range_df["area_name_en"].tolist()
 
-# LOAD DASH DATA
-data_for_dash = pd.read_csv("Data_data_columns/data_for_dash.csv")
-data_for_dash['instance_date'] = pd.to_datetime(data_for_dash['instance_date'], errors='coerce')
-data_for_dash['month'] = data_for_dash['instance_date'].dt.to_period('M')
+# LOAD DASH DATA (monthly medians per filter combination, see trend_cube.py)
+trend_cube = get_trend_cube()
 
  
 # YES/NO → 1/0
@@ -25,7 +35,7 @@ to_bool = lambda x: 1 if x == "Yes" else 0
 # ---------------------------------------------------
 st.title("Dubai Real Estate Dashboard")
 
-tab1, tab2 = st.tabs(["Prediction", "Monthly Trend"])
+tab1, tab2, tab3 = st.tabs(["Prediction", "Monthly Trend", "Monthly Trend (Smoothed)"])
 
 # ----------------- TAB 1 -----------------
 with tab1:
@@ -62,28 +72,58 @@ with tab1:
         elevator      = to_bool(st.selectbox("Elevator", ["Yes", "No"]))
         metro         = to_bool(st.selectbox("Metro Access", ["Yes", "No"]))
 
+        input_data = {
+            "area_name_en": area,
+            "procedure_area": procedure_area,
+            "has_parking": has_parking,
+            "floor_bin": floor_bin,
+            "rooms_en": rooms_en,
+            "swimming_pool": swimming_pool,
+            "balcony": balcony,
+            "elevator": elevator,
+            "metro": metro
+        }
+
         if st.button("Predict Price"):
-            input_data = {
-                "area_name_en": area,
-                "procedure_area": procedure_area,
-                "has_parking": has_parking,
-                "floor_bin": floor_bin,
-                "rooms_en": rooms_en,
-                "swimming_pool": swimming_pool,
-                "balcony": balcony,
-                "elevator": elevator,
-                "metro": metro
-            }
-            final_df = predict_with_area(input_data)
+            final_df = predict_with_area(input_data, bands=True)
             if final_df is not None:
                 st.write("### Last 10 Months Forecast")
                 st.dataframe(final_df.tail(10))
                 df_chart = final_df.copy()
                 df_chart["month"] = pd.to_datetime(df_chart["month"], errors="coerce")
-                st.line_chart(df_chart.set_index("month")["median_price"])
+                st.line_chart(df_chart.set_index("month")[["median_price", "lower_price", "upper_price"]])
+
+        # What-if: the whole grid of one or two inputs in one batched call,
+        # every other input as entered above
+        with st.expander("What-if Sweep"):
+            sweep_axes = st.multiselect(
+                "Vary (up to two)",
+                ["procedure_area", "rooms_en", "floor_bin", "has_parking", "swimming_pool", "balcony", "elevator", "metro"],
+                default=["procedure_area"],
+                max_selections=2,
+                key="sweep_axes"
+            )
+            if st.button("Run Sweep") and sweep_axes:
+                st.session_state["sweep_df"] = sweep_with_area(input_data, sweep_axes)
+
+            sweep_df = st.session_state.get("sweep_df")
+            if sweep_df is not None and sweep_df.columns[0] in sweep_axes:
+                axes = [col for col in sweep_df.columns
+                        if col not in ("base_price", "month", "median_price", "lower_price", "upper_price")]
+                sweep_month = st.selectbox("Forecast Month", sorted(sweep_df["month"].dropna().unique()),
+                                           key="sweep_month")
+                surface = sweep_df[sweep_df["month"] == sweep_month]
+                if len(axes) == 1:
+                    surface = surface.set_index(axes[0])["median_price"]
+                else:
+                    surface = surface.pivot_table(index=axes[0], columns=axes[1], values="median_price")
+                if axes[0] == "procedure_area":
+                    st.line_chart(surface)
+                else:
+                    st.bar_chart(surface)
+                st.dataframe(surface)
 
 
-from statsmodels.nonparametric.smoothers_lowess import lowess
 with tab2:
     st.header("Monthly Trend + Forecast")
 
@@ -103,27 +143,12 @@ with tab2:
         # -------------------------
         # Filter historical data
         # -------------------------
-        trend_df = data_for_dash[
-            (data_for_dash["area_name_en"] == sel_area) &
-            (data_for_dash["rooms_en"] == sel_rooms) &
-            (data_for_dash["floor_bin"] == sel_floor) &
-            (data_for_dash["has_parking"] == to_bool(sel_parking)) &
-            (data_for_dash["swimming_pool"] == to_bool(sel_pool)) &
-            (data_for_dash["balcony"] == to_bool(sel_balcony)) &
-            (data_for_dash["elevator"] == to_bool(sel_elevator)) &
-            (data_for_dash["metro"] == to_bool(sel_metro))
-        ].copy()
+        trend_df = trend_cube.trend(sel_area, sel_rooms, sel_floor, to_bool(sel_parking), to_bool(sel_pool),
+                                    to_bool(sel_balcony), to_bool(sel_elevator), to_bool(sel_metro))
 
         if trend_df.empty:
             st.warning("No historical data found for selected features!")
         else:
-            # Convert date to month start
-            trend_df['month'] = pd.to_datetime(trend_df['instance_date'], errors='coerce')
-            trend_df = trend_df.set_index('month').resample('MS').median(numeric_only=True)
-            trend_df.rename(columns={'meter_sale_price': 'median_price'}, inplace=True)
-            trend_df['median_price'] = trend_df['median_price'].interpolate().bfill()
-            trend_df = trend_df.reset_index()
-
             # -------------------------
             # Predict next value using model
             # -------------------------
@@ -161,53 +186,31 @@ with tab3:
     st.header("Monthly Trend + Forecast (Smoothed)")
 
     # Feature selection (same as before)
-    sel_area = st.selectbox("Select Area", ["-- Select Area --"] + area_list, key="trend_area")
-    sel_rooms = st.selectbox("Select Rooms", ['1 B/R', 'Studio', '2 B/R', '3 B/R', 'PENTHOUSE', 'More than 3B/R'], key="trend_rooms")
+    sel_area = st.selectbox("Select Area", ["-- Select Area --"] + area_list, key="smooth_area")
+    sel_rooms = st.selectbox("Select Rooms", ['1 B/R', 'Studio', '2 B/R', '3 B/R', 'PENTHOUSE', 'More than 3B/R'], key="smooth_rooms")
     sel_floor = st.selectbox("Select Floor Bin", ['1-10', '11-20', '41-50', '21-30', 'Below 1st floor', '31-40',
                                                   '51-60', 'Other', '-9-0', '61-70', 'Top floor', '91-100', '81-90',
-                                                  '71-80', 'Duplex'], key="trend_floor")
-    sel_parking   = st.selectbox("Parking", ["Yes", "No"], key="trend_parking")
-    sel_pool      = st.selectbox("Swimming Pool", ["Yes", "No"], key="trend_pool")
-    sel_balcony   = st.selectbox("Balcony", ["Yes", "No"], key="trend_balcony")
-    sel_elevator  = st.selectbox("Elevator", ["Yes", "No"], key="trend_elevator")
-    sel_metro     = st.selectbox("Metro Access", ["Yes", "No"], key="trend_metro")
+                                                  '71-80', 'Duplex'], key="smooth_floor")
+    sel_parking   = st.selectbox("Parking", ["Yes", "No"], key="smooth_parking")
+    sel_pool      = st.selectbox("Swimming Pool", ["Yes", "No"], key="smooth_pool")
+    sel_balcony   = st.selectbox("Balcony", ["Yes", "No"], key="smooth_balcony")
+    sel_elevator  = st.selectbox("Elevator", ["Yes", "No"], key="smooth_elevator")
+    sel_metro     = st.selectbox("Metro Access", ["Yes", "No"], key="smooth_metro")
 
     if st.button("Show Smoothed Trend + Forecast"):
         # -------------------------
         # Filter historical data
         # -------------------------
-        trend_df = data_for_dash[
-            (data_for_dash["area_name_en"] == sel_area) &
-            (data_for_dash["rooms_en"] == sel_rooms) &
-            (data_for_dash["floor_bin"] == sel_floor) &
-            (data_for_dash["has_parking"] == to_bool(sel_parking)) &
-            (data_for_dash["swimming_pool"] == to_bool(sel_pool)) &
-            (data_for_dash["balcony"] == to_bool(sel_balcony)) &
-            (data_for_dash["elevator"] == to_bool(sel_elevator)) &
-            (data_for_dash["metro"] == to_bool(sel_metro))
-        ].copy()
+        trend_df = trend_cube.trend(sel_area, sel_rooms, sel_floor, to_bool(sel_parking), to_bool(sel_pool),
+                                    to_bool(sel_balcony), to_bool(sel_elevator), to_bool(sel_metro))
 
         if trend_df.empty:
             st.warning("No historical data found for selected features!")
         else:
-            # Convert to datetime and remove duplicates
-            trend_df['month'] = pd.to_datetime(trend_df['instance_date'], errors='coerce').dt.to_period('MS')
-            trend_df = trend_df.drop_duplicates(subset='month')
-
-            # Aggregate monthly median price
-            trend_df = trend_df.groupby('month')['meter_sale_price'].median().reset_index()
-            trend_df.rename(columns={'meter_sale_price': 'median_price'}, inplace=True)
-
-            # Interpolate/backfill missing months
-            trend_df = trend_df.set_index('month').resample('MS').median()
-            trend_df['median_price'] = trend_df['median_price'].interpolate().bfill()
-            trend_df = trend_df.reset_index()
-
             # -------------------------
             # Apply LOWESS smoothing only on historical trend
             # -------------------------
-            smoothed = lowess(trend_df['median_price'], trend_df['month'].astype(str), frac=0.5)
-            trend_df['median_price_smooth'] = smoothed[:, 1]
+            trend_df['median_price_smooth'] = smooth(trend_df['median_price'].to_numpy(), frac=0.5)
 
             # -------------------------
             # Predict next value using model
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact_models import compact, compare_area, holdout_rows
+from model_registry import AreaModel, ModelRegistry
+from tree_engine import check_parity
+
+REGISTRY = ModelRegistry(bundle_path=None, compiled_dir=None, snapshot=None)
+
+
+def _encoded(entry, row):
+    out = np.zeros(entry.encoder.n_features)
+    entry.encoder.encode(row, out=out)
+    return out
+
+
+@pytest.mark.parametrize("key", sorted(REGISTRY.index))
+def test_compact_tree_matches_sklearn_at_float32(key):
+    entry = REGISTRY.get(key)
+    compacted = AreaModel(entry.area, entry.model_path, entry.columns, compact(entry.tree), entry.model)
+    assert compacted.tree.left.dtype == np.int16 and compacted.tree.value.dtype == np.float32
+    assert compacted.tree.nbytes < entry.tree.nbytes / 2
+    rows, differing = check_parity(compacted)
+    assert differing == 0
+
+
+def test_report_measures_validation_error_on_held_out_rows():
+    # Transactions priced by the tree itself: its validation error is ~0,
+    # the compact tree's only the float32 rounding
+    entry = REGISTRY.get("Business Bay")
+    rng = np.random.default_rng(0)
+    rows = pd.DataFrame({
+        "area_name_en": "Business Bay",
+        "procedure_area": rng.uniform(30, 300, 500).round(2),
+        **{field: rng.integers(0, 2, 500) for field in ("has_parking", "swimming_pool", "balcony",
+                                                         "elevator", "metro")},
+        "floor_bin": rng.choice(sorted(entry.encoder.categories["floor_bin"]), 500),
+        "rooms_en": rng.choice(sorted(entry.encoder.categories["rooms_en"]), 500),
+    })
+    X = np.array([_encoded(entry, row) for row in rows.to_dict("records")])
+    rows["meter_sale_price"] = entry.tree.predict(X)
+
+    report = compare_area(entry, holdout_rows(rows)["business bay"])
+    assert report["val_rows"] == 100 and report["val_is_holdout"]
+    assert report["val_mae"] == 0.0
+    assert report["compact_val_mae"] < 0.01
+    assert "history_mape" not in report
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from model_registry import get_registry
+from model_testing1 import predict_many, predict_series, predict_series_many
+
+FULL = {"area_name_en": "Business Bay", "procedure_area": 100, "has_parking": 1, "swimming_pool": 0,
+        "balcony": 1, "elevator": 1, "metro": 1, "floor_bin": "1-10", "rooms_en": "1 B/R"}
+PARTIAL = [
+    {"area_name_en": "Business Bay", "procedure_area": 100},
+    {**FULL, "has_parking": None, "metro": float("nan")},
+    {**FULL, "procedure_area": None, "rooms_en": None},
+]
+
+
+@pytest.fixture
+def encoder():
+    return get_registry().get("Business Bay").encoder
+
+
+def test_encode_columns_matches_encode_on_missing_fields(encoder):
+    inputs = [FULL] + PARTIAL
+    fields = sorted({field for input_data in inputs for field in input_data})
+    data = {field: np.array([i.get(field) for i in inputs], dtype=object) for field in fields}
+    X, unknown = encoder.encode_columns(data, len(inputs))
+
+    assert not np.isnan(X).any()
+    for row, input_data in enumerate(inputs):
+        expected = np.zeros(encoder.n_features)
+        expected_unknown = encoder.encode(input_data, out=expected)
+        assert np.array_equal(X[row], expected)
+        assert sorted((f, v) for r, f, v in unknown if r == row) == sorted(expected_unknown)
+
+
+def test_missing_numeric_is_reported(encoder):
+    unknown = encoder.encode({"area_name_en": "Business Bay", "procedure_area": 100})
+    assert ("has_parking", None) in unknown
+    assert ("procedure_area", None) not in unknown
+
+
+def test_unhashable_categories_are_unknown(encoder):
+    for value in ([], {"a": 1}):
+        out = np.zeros(encoder.n_features)
+        assert ("rooms_en", value) in encoder.encode({**FULL, "rooms_en": value}, out=out)
+        X, unknown = encoder.encode_columns({"rooms_en": np.array([value, "1 B/R"], dtype=object)}, 2)
+        assert (0, "rooms_en", value) in unknown
+
+
+def test_batch_price_does_not_depend_on_other_rows():
+    # Alone, next to a full row, and through both batch paths
+    for input_data in PARTIAL:
+        _, alone, _ = predict_series(input_data)
+        for batch in ([input_data], [FULL, input_data]):
+            frame = predict_many(batch)
+            forecast = frame[frame["row"] == len(batch) - 1]["median_price"].to_numpy()
+            assert np.array_equal(forecast, alone[-len(forecast):])
+            _, many, _ = predict_series_many(batch)[-1]
+            assert np.array_equal(many, alone)
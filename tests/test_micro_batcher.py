@@ -0,0 +1,50 @@
+import asyncio
+import collections
+import functools
+
+import numpy as np
+import pytest
+
+import prediction_service
+from micro_batcher import MicroBatcher
+from model_testing1 import predict_series, predict_series_many
+from test_prediction_service import GOOD, call
+
+BAD = {**GOOD, "area_name_en": 5}  # gets past the batcher, fails inside predict_series_many
+
+
+def test_failing_input_only_fails_its_own_request():
+    async def run():
+        batcher = MicroBatcher(predict_series_many, window_ms=5)
+        inputs = [BAD if i % 50 == 0 else GOOD for i in range(400)]
+        results = await asyncio.gather(*(batcher.submit(i) for i in inputs), return_exceptions=True)
+        return batcher, inputs, results
+
+    batcher, inputs, results = asyncio.run(run())
+    _, expected, _ = predict_series(GOOD)
+    for input_data, result in zip(inputs, results):
+        if input_data is BAD:
+            assert isinstance(result, AttributeError)
+        else:
+            assert np.array_equal(result[1], expected)
+    assert batcher.stats()["retried"] >= 1
+    assert batcher.batches < len(inputs)
+
+
+@pytest.fixture
+def batched_service():
+    yield
+    prediction_service._batcher = None
+
+
+def test_concurrent_predict_mixes_good_and_bad_requests(batched_service):
+    bad = {**GOOD, "procedure_area": [1, 2]}
+
+    async def run():
+        # As the service's lifespan sets it up
+        prediction_service._batcher = MicroBatcher(functools.partial(predict_series_many, bands=True), window_ms=5)
+        bodies = [bad if i % 50 == 0 else GOOD for i in range(400)]
+        return await asyncio.gather(*(call(prediction_service.predict, body) for body in bodies))
+
+    statuses = collections.Counter(status for status, _ in asyncio.run(run()))
+    assert statuses == {200: 392, 422: 8}
@@ -0,0 +1,27 @@
+import pytest
+
+from model_bundle import build_bundle
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    path = str(tmp_path / "dt_models.bundle")
+    build_bundle(ModelRegistry(bundle_path=None).index, path)
+    return path
+
+
+def test_registry_serves_a_valid_bundle(bundle_path):
+    assert ModelRegistry(bundle_path=bundle_path).stats()["source"] == "bundle"
+
+
+def test_registry_ignores_a_corrupt_bundle(bundle_path):
+    with open(bundle_path, "r+b") as file:
+        file.seek(-1, 2)
+        last = file.read(1)
+        file.seek(-1, 2)
+        file.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.warns(UserWarning, match="checksum"):
+        registry = ModelRegistry(bundle_path=bundle_path)
+    assert registry.stats()["source"] == "pickle"
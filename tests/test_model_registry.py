@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from model_registry import COLUMNS_PREFIX, MANIFEST_NAME, MODEL_PREFIX, MODELS_DIR, TRAINED_DIR, ModelRegistry
+from tree_engine import compiled_path
+
+
+def _sha256(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    # Two areas' pickles and a manifest naming the pairs, as train_models.py writes it
+    models_dir, trained_dir = tmp_path / "dt_models", tmp_path / "trained_columns"
+    models_dir.mkdir()
+    trained_dir.mkdir()
+    manifest = {"areas": {}}
+    for area in ("Business Bay", "Burj Khalifa"):
+        model_path = shutil.copy(os.path.join(MODELS_DIR, f"{MODEL_PREFIX}{area}.pkl"), models_dir)
+        columns_path = shutil.copy(os.path.join(TRAINED_DIR, f"{COLUMNS_PREFIX}{area}.pkl"), trained_dir)
+        manifest["areas"][area.lower()] = {"model_sha256": _sha256(model_path),
+                                           "columns_sha256": _sha256(columns_path)}
+    (models_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+    return str(models_dir), str(trained_dir)
+
+
+def _registry(dirs):
+    return ModelRegistry(*dirs, compiled_dir=None, bundle_path=None, snapshot=None)
+
+
+def test_pair_matching_the_manifest_is_served(dirs):
+    assert _registry(dirs).get("Business Bay") is not None
+
+
+def test_torn_pair_is_not_served(dirs):
+    # New columns next to the old tree, as a crash between the two renames leaves them
+    models_dir, trained_dir = dirs
+    shutil.copy(os.path.join(trained_dir, f"{COLUMNS_PREFIX}Burj Khalifa.pkl"),
+                os.path.join(trained_dir, f"{COLUMNS_PREFIX}Business Bay.pkl"))
+    registry = _registry(dirs)
+    with pytest.warns(UserWarning, match="do not match"):
+        assert registry.get("Business Bay") is None
+    assert registry.get("Burj Khalifa") is not None
+
+
+def test_torn_pair_is_refused_once_until_its_files_change(dirs):
+    models_dir, trained_dir = dirs
+    business_bay = os.path.join(trained_dir, f"{COLUMNS_PREFIX}Business Bay.pkl")
+    original = open(business_bay, "rb").read()
+    shutil.copy(os.path.join(trained_dir, f"{COLUMNS_PREFIX}Burj Khalifa.pkl"), business_bay)
+    registry = _registry(dirs)
+    with pytest.warns(UserWarning) as record:
+        for _ in range(3):
+            assert registry.get("Business Bay") is None
+    assert len(record) == 1
+
+    # The retrain finishes: the pair matches the manifest again
+    with open(business_bay, "wb") as file:
+        file.write(original)
+    assert registry.get("Business Bay") is not None
+
+
+def test_compiled_tree_is_served_without_reading_the_model_pickle(dirs, tmp_path):
+    models_dir, trained_dir = dirs
+    model_path = os.path.join(models_dir, f"{MODEL_PREFIX}Business Bay.pkl")
+    compiled_dir = str(tmp_path / "compiled_models")
+    tree = _registry(dirs).get("Business Bay").tree
+    tree.save(compiled_path("Business Bay", compiled_dir))
+
+    # Unreadable as a pickle and off the manifest hash, but older than the export
+    stat = os.stat(model_path)
+    with open(model_path, "wb") as file:
+        file.write(b"not a pickle")
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    entry = ModelRegistry(*dirs, compiled_dir=compiled_dir, bundle_path=None, snapshot=None).get("Business Bay")
+    assert entry is not None and entry._model is None
+    np.testing.assert_array_equal(entry.tree.value, tree.value)
+
+
+def test_areas_outside_the_manifest_are_served(dirs):
+    os.remove(os.path.join(dirs[0], MANIFEST_NAME))
+    assert _registry(dirs).get("Business Bay") is not None
+
+
+def _repo_registry(max_bytes=None):
+    return ModelRegistry(compiled_dir=None, bundle_path=None, snapshot=None, max_bytes=max_bytes)
+
+
+def test_cache_evicts_least_recently_used_over_budget():
+    a, b, c = "Business Bay", "Burj Khalifa", "Nadd Hessa"
+    sizes = {area: _repo_registry().get(area).nbytes for area in (a, b, c)}
+    # Room for any two of the three areas
+    registry = _repo_registry(max_bytes=sum(sizes.values()) - min(sizes.values()))
+
+    registry.get(a)
+    registry.get(b)
+    registry.get(a)  # a becomes the most recently used
+    registry.get(c)  # so b is the one evicted
+    stats = registry.stats()
+    assert list(registry._cache) == [a.lower(), c.lower()]
+    assert stats["resident"] == 2 and stats["cached_bytes"] == sizes[a] + sizes[c] <= registry.max_bytes
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+
+    registry.get(b)  # reloaded, and now a is the oldest
+    stats = registry.stats()
+    assert list(registry._cache) == [c.lower(), b.lower()]
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
+
+
+def test_entry_over_budget_is_kept_alone():
+    registry = _repo_registry(max_bytes=1)
+    registry.get("Business Bay")
+    assert registry.get("Burj Khalifa") is registry.get("Burj Khalifa")
+    stats = registry.stats()
+    assert stats["resident"] == 1 and (stats["hits"], stats["misses"], stats["evictions"]) == (1, 2, 1)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_testing1
+from data_store import DataStore
+from monthly_store import MonthlyStore
+from smoothing import SmoothingCache
+
+AREA = "Business Bay"
+INPUT = {"area_name_en": AREA, "procedure_area": 100, "has_parking": 1, "swimming_pool": 0,
+         "balcony": 1, "elevator": 1, "metro": 1, "floor_bin": "1-10", "rooms_en": "1 B/R"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DataStore(store_dir=str(tmp_path / "monthly_store"), check_interval=0.0, snapshot=None)
+
+
+@pytest.fixture
+def served(store, monkeypatch):
+    monkeypatch.setattr(model_testing1, "get_data_store", lambda: store)
+    monkeypatch.setattr(model_testing1, "get_smoothing_cache", lambda: SmoothingCache(store))
+    return store
+
+
+def test_store_seeded_after_start_is_picked_up(store):
+    assert store.history_store is None
+    csv_history = store.get_history(AREA)
+
+    MonthlyStore(store.store_dir).seed()
+    store.refresh()
+    assert store.history_store is not None
+    assert list(store.get_history(AREA).month) == list(csv_history.month)
+
+
+def test_ingest_into_forecast_months_does_not_duplicate_them(served):
+    forecast = served.get_forecast(AREA)
+    covered = list(forecast.month[:2])
+
+    monthly = MonthlyStore(served.store_dir)
+    monthly.seed()
+    monthly.ingest(pd.DataFrame({"area_name_en": AREA, "instance_date": covered * 3,
+                                 "meter_sale_price": [20000.0, 21000.0] * 3}))
+    served.refresh()
+    assert served.get_history(AREA).month[-1] == covered[-1]
+
+    months, prices, _ = model_testing1.predict_series(INPUT)
+    assert len(set(months)) == len(months) and list(months) == sorted(months)
+    assert list(months[-len(forecast) + 2:]) == list(forecast.month[2:])
+
+    # The batch paths cut the forecast the same way
+    _, many, _ = model_testing1.predict_series_many([INPUT])[0]
+    assert np.array_equal(many, prices)
+    assert list(model_testing1.predict_many([INPUT])["month"]) == list(forecast.month[2:])
+
+
+def test_ingest_keeps_the_median_of_a_seeded_month(tmp_path):
+    monthly = MonthlyStore(str(tmp_path / "monthly_store"))
+    monthly.seed()
+    seeded = monthly.medians([AREA]).iloc[-1]
+    later = (pd.Timestamp(seeded.month) + pd.offsets.MonthBegin(1)).strftime("%Y-%m-%d")
+
+    batch = pd.DataFrame({"area_name_en": AREA, "instance_date": [seeded.month, later],
+                          "meter_sale_price": [1.0, 2.0]})
+    with pytest.warns(UserWarning, match="kept the seeded medians"):
+        assert monthly.ingest(batch) == {AREA: [later]}
+
+    medians = monthly.medians([AREA]).set_index("month")
+    assert medians.loc[seeded.month, "median_price"] == seeded.median_price
+    assert medians.loc[seeded.month, "count"] == 0
+    assert medians.loc[later, "median_price"] == 2.0 and medians.loc[later, "count"] == 1
+    assert len(monthly.transactions(AREA, seeded.month)) == 1
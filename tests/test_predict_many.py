@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from model_testing1 import MAX_SWEEP_ROWS, predict_many, predict_sweep
+
+INPUT = {"area_name_en": "Business Bay", "procedure_area": 100, "has_parking": 1, "swimming_pool": 0,
+         "balcony": 1, "elevator": 1, "metro": 1, "floor_bin": "1-10", "rooms_en": "1 B/R"}
+
+
+def test_empty_batch_returns_empty_frame():
+    df = predict_many([])
+    assert len(df) == 0
+    assert {"row", "base_price", "median_price", "unknown_categories"} <= set(df.columns)
+
+
+def test_rows_without_area_are_reported_per_row():
+    inputs = [{**INPUT, "area_name_en": None}, {k: v for k, v in INPUT.items() if k != "area_name_en"}, INPUT]
+    df = predict_many(inputs)
+
+    bad = df[df["row"] < 2]
+    assert list(bad["row"]) == [0, 1]
+    assert bad["base_price"].isna().all()
+    assert bad["unknown_categories"].str.startswith("area_name_en=").all()
+
+    good = df[df["row"] == 2]
+    assert len(good) > 1 and np.isfinite(good["base_price"]).all()
+    assert (predict_many([INPUT])["median_price"].to_numpy() == good["median_price"].to_numpy()).all()
+
+
+def test_sweep_bounds_are_checked_before_the_grid_is_built():
+    for points in (10 ** 8, 0, None, 2.5, True):
+        with pytest.raises(ValueError, match="points"):
+            predict_sweep(INPUT, ["procedure_area"], points)
+    with pytest.raises(ValueError, match=str(MAX_SWEEP_ROWS)):
+        predict_sweep(INPUT, {"procedure_area": iter(range(10 ** 12))})
+    with pytest.raises(ValueError, match="field names"):
+        predict_sweep(INPUT, [["procedure_area"]])
+    assert len(predict_sweep(INPUT, ["procedure_area"], 5)["procedure_area"].unique()) == 5
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from starlette.requests import Request
+
+import prediction_service
+from model_registry import get_registry
+from price_cube import build_area_cube
+
+GOOD = {"area_name_en": "Business Bay", "procedure_area": 80, "rooms_en": "1 B/R", "floor_bin": "1-10",
+        "has_parking": 1, "swimming_pool": 1, "balcony": 1, "elevator": 1, "metro": 1}
+
+
+async def call(endpoint, body, query=b""):
+    # The endpoint coroutine on a bare ASGI request; no HTTP client needed
+    raw = json.dumps(body).encode()
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": query, "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    response = await endpoint(Request(scope, receive))
+    return response.status_code, json.loads(response.body)
+
+
+def test_cube_lookup_rejects_non_scalar_inputs():
+    entry = get_registry().get("Business Bay")
+    cube = build_area_cube(entry.encoder, entry.tree)
+    assert cube.lookup(GOOD) is not None
+    for field in ("procedure_area", "has_parking"):
+        assert cube.lookup({**GOOD, field: [1, 2]}) is None
+    assert cube.lookup({**GOOD, "procedure_area": float("nan")}) is None
+
+
+def test_predict_rejects_non_scalar_inputs():
+    for field, value in [("procedure_area", [1, 2]), ("rooms_en", []), ("metro", {"a": 1})]:
+        status, body = asyncio.run(call(prediction_service.predict, {**GOOD, field: value}))
+        assert status == 422 and field in body["error"]
+    status, body = asyncio.run(call(prediction_service.predict, GOOD))
+    assert status == 200 and body["rows"]
+
+
+def test_predict_batch_validates_every_input():
+    for bad in [{"area_name_en": None}, {"procedure_area": 80}, {**GOOD, "rooms_en": []}, "Business Bay"]:
+        status, body = asyncio.run(call(prediction_service.predict_batch, {"inputs": [GOOD, bad]}))
+        assert status == 422 and "input 1" in body["error"]
+    status, body = asyncio.run(call(prediction_service.predict_batch, {"inputs": [GOOD, GOOD]}))
+    assert status == 200 and {row["row"] for row in body["rows"]} == {0, 1}
+
+
+def test_profile_route_is_mounted_only_when_enabled(monkeypatch):
+    import importlib
+
+    assert "/debug/profile" not in [route.path for route in prediction_service.app.routes]
+    monkeypatch.setenv("PREDICTION_DEBUG_PROFILE", "1")
+    try:
+        assert "/debug/profile" in [route.path for route in importlib.reload(prediction_service).app.routes]
+    finally:
+        monkeypatch.delenv("PREDICTION_DEBUG_PROFILE")
+        importlib.reload(prediction_service)
+
+
+def test_sweep_rejects_malformed_points_and_axes():
+    for extra in [{"points": None}, {"points": "5"}, {"axes": [["procedure_area"]]},
+                  {"axes": {"procedure_area": 5}}, {"axes": {"procedure_area": [[1, 2]]}},
+                  {"points": 10 ** 8}]:
+        body = {"input": GOOD, "axes": ["procedure_area"], **extra}
+        status, response = asyncio.run(call(prediction_service.sweep, body))
+        assert status == 422, (extra, response)
+    status, response = asyncio.run(call(prediction_service.sweep, {"input": GOOD, "axes": ["balcony"]}))
+    assert status == 200 and response["rows"]
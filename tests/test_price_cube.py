@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import price_cube
+from model_registry import ModelRegistry
+from price_cube import PriceCube, build_area_cube, get_price_cube
+
+AREAS = ("Business Bay", "Nadd Hessa")
+
+
+def _cube(registry, version="v1"):
+    return PriceCube(version, {key.lower(): build_area_cube(registry.get(key).encoder, registry.get(key).tree)
+                               for key in AREAS})
+
+
+def test_saved_cube_is_mapped_and_looks_up_the_same(tmp_path):
+    cube = _cube(ModelRegistry(bundle_path=None, snapshot=None))
+    path = str(tmp_path / "price_cube.bin")
+    cube.save(path)
+    loaded = PriceCube.load(path)
+
+    assert loaded.model_version == "v1" and set(loaded.cubes) == set(cube.cubes)
+    for key, area_cube in cube.cubes.items():
+        mapped = loaded.cubes[key]
+        assert mapped.axes == area_cube.axes and mapped.continuous == area_cube.continuous
+        for name in ("offsets", "breaks", "values", "levels"):
+            array = getattr(mapped, name)
+            assert not array.flags.owndata and not array.flags.writeable
+            np.testing.assert_array_equal(array, getattr(area_cube, name))
+
+    inputs = {"area_name_en": "Business Bay", "rooms_en": "1 B/R", "floor_bin": "1-10", "has_parking": 1}
+    for area in np.linspace(20, 400, 50):
+        row = {**inputs, "procedure_area": area}
+        assert loaded.lookup("business bay", row) == cube.lookup("business bay", row)
+
+
+@pytest.mark.parametrize("keep", [0, 10, 100, -1])
+def test_truncated_cube_is_not_served(tmp_path, monkeypatch, keep):
+    registry = ModelRegistry(bundle_path=None, snapshot=None)
+    path = tmp_path / "price_cube.bin"
+    _cube(registry, registry.model_version).save(str(path))
+    monkeypatch.setattr(price_cube, "PRICE_CUBE_PATH", str(path))
+    monkeypatch.setattr(price_cube, "_cube_checked", False)
+    assert get_price_cube(registry) is not None
+
+    path.write_bytes(path.read_bytes()[:keep])
+    monkeypatch.setattr(price_cube, "_cube", None)
+    monkeypatch.setattr(price_cube, "_cube_checked", False)
+    with pytest.warns(UserWarning, match="Ignoring price cube"):
+        assert get_price_cube(registry) is None
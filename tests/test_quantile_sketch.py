@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from quantile_sketch import QUANTILES, SKETCH_K, KLLSketch, quantiles, sketch_groups
+
+QS = np.array([0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+MAX_RANK_ERROR = 2.5 / SKETCH_K
+
+
+def _values(n, seed=0):
+    return np.random.default_rng(seed).lognormal(9.5, 0.4, n)
+
+
+def _rank_error(values, estimates, qs):
+    ordered = np.sort(values)
+    return np.abs(np.searchsorted(ordered, estimates) / len(values) - qs).max()
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, SKETCH_K])
+def test_exact_mode_matches_numpy(n):
+    values = _values(n)
+    sketch = KLLSketch().update(values[: n // 2]).update(values[n // 2:])
+    assert sketch.exact and sketch.n == n
+    assert sketch.quantile(0.5) == np.median(values)
+    for q in QS[QS != 0.5]:
+        assert sketch.quantile(q) == np.quantile(values, q)
+    # The batched path gives the same numbers
+    np.testing.assert_array_equal(quantiles([sketch], QUANTILES)[0], sketch.quantile(QUANTILES))
+
+
+def test_rank_error_after_compaction():
+    values = _values(200_000)
+    sketch = KLLSketch()
+    for chunk in np.array_split(values, 100):
+        sketch.update(chunk)
+    assert not sketch.exact and sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 4 * SKETCH_K
+    assert _rank_error(values, sketch.quantile(QS), QS) <= MAX_RANK_ERROR
+
+
+def test_rank_error_after_merge():
+    parts = [_values(n, seed) for seed, n in enumerate([50, 30_000, 70_000, 100_000])]
+    merged = KLLSketch()
+    for part in parts:
+        merged.merge(KLLSketch().update(part))
+    values = np.concatenate(parts)
+    assert merged.n == len(values)
+    assert _rank_error(values, merged.quantile(QS), QS) <= MAX_RANK_ERROR
+
+
+def test_merge_rejects_a_different_k():
+    with pytest.raises(ValueError):
+        KLLSketch(100).merge(KLLSketch(200))
+
+
+@pytest.mark.parametrize("n", [0, 5, 50_000])
+def test_bytes_round_trip(n):
+    sketch = KLLSketch().update(_values(n))
+    restored = KLLSketch.from_bytes(sketch.to_bytes())
+    assert (restored.k, restored.n, len(restored.levels)) == (sketch.k, sketch.n, len(sketch.levels))
+    for a, b in zip(restored.levels, sketch.levels):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(restored.quantile(QUANTILES), sketch.quantile(QUANTILES))
+    # A restored sketch keeps accepting values
+    assert restored.update([1.0]).n == n + 1
+
+
+def test_empty_sketch_and_nans():
+    sketch = KLLSketch().update([np.nan])
+    assert sketch.n == 0 and np.isnan(sketch.quantile(0.5))
+    assert np.isnan(quantiles([sketch])).all()
+
+
+def test_sketch_groups_matches_groupby():
+    import pandas as pd
+
+    df = pd.DataFrame({"area": np.repeat(["a", "b", "c"], [3, 10, 4]), "price": _values(17)})
+    sketches = sketch_groups(df, "area", "price")
+    expected = df.groupby("area")["price"].median()
+    assert {area: sketch.quantile(0.5) for area, sketch in sketches.items()} == expected.to_dict()
@@ -0,0 +1,18 @@
+import json
+
+import numpy as np
+import pytest
+
+from snapshot import SNAPSHOT_FORMAT, _open
+
+
+@pytest.mark.parametrize("keep", [0.0, 0.3, 0.9, 0.99])
+def test_truncated_snapshot_is_ignored(tmp_path, keep):
+    path = tmp_path / "prediction_state.npz"
+    np.savez(path, meta=np.array(json.dumps({"format": SNAPSHOT_FORMAT})), values=np.arange(10_000.0))
+    assert _open(str(path)) is not None
+
+    raw = path.read_bytes()
+    path.write_bytes(raw[:int(len(raw) * keep)])
+    with pytest.warns(UserWarning, match="Ignoring prediction snapshot"):
+        assert _open(str(path)) is None
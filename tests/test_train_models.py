@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from model_registry import MANIFEST_NAME, ModelRegistry
+from train_models import load_manifest, train_all
+
+
+def _frame(areas, rows=40, seed=0):
+    rng = np.random.default_rng(seed)
+    n = rows * len(areas)
+    return pd.DataFrame({
+        "area_name_en": np.repeat(areas, rows),
+        "procedure_area": rng.uniform(30, 300, n),
+        "rooms_en": rng.choice(["Studio", "1 B/R", "2 B/R"], n),
+        "floor_bin": rng.choice(["1-10", "11-20"], n),
+        **{flag: rng.integers(0, 2, n) for flag in ("has_parking", "swimming_pool", "balcony", "elevator", "metro")},
+        "meter_sale_price": rng.uniform(10_000, 30_000, n),
+    })
+
+
+def _quiet(message):
+    pass
+
+
+def test_failed_fit_keeps_the_other_areas_served(tmp_path):
+    models_dir, trained_dir = str(tmp_path / "dt_models"), str(tmp_path / "trained_columns")
+    manifest_path = str(tmp_path / "dt_models" / MANIFEST_NAME)
+    train_all(_frame(["Alpha", "Beta"]), models_dir, trained_dir, workers=2, log=_quiet)
+    before = load_manifest(manifest_path)["areas"]["beta"]
+
+    # Beta's fit now fails (infinite target); Alpha is refit
+    df = _frame(["Alpha", "Beta"], seed=1)
+    df.loc[df["area_name_en"] == "Beta", "meter_sale_price"] = np.inf
+    manifest = train_all(df, models_dir, trained_dir, workers=2, log=_quiet)
+
+    assert manifest["trained"] == ["alpha"] and list(manifest["failed"]) == ["beta"]
+    assert load_manifest(manifest_path) == manifest
+    assert manifest["areas"]["beta"] == before
+    registry = ModelRegistry(models_dir, trained_dir, compiled_dir=None, bundle_path=None, snapshot=None)
+    assert registry.get("Alpha") is not None and registry.get("Beta") is not None
@@ -0,0 +1,17 @@
+import pytest
+
+from model_registry import get_registry
+from tree_engine import check_parity
+
+AREAS = get_registry().areas()
+
+
+def test_every_area_is_served():
+    assert len(AREAS) == 18
+
+
+@pytest.mark.parametrize("area", AREAS)
+def test_served_tree_matches_sklearn(area):
+    # The tree the service actually uses (snapshot, bundle or pickle) against the pickle
+    rows, differing = check_parity(get_registry().get(area))
+    assert rows > 0 and differing == 0
@@ -0,0 +1,267 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from model_registry import (COLUMNS_PREFIX, MANIFEST_NAME, MODEL_PREFIX, MODELS_DIR, TRAINED_DIR, ModelRegistry,
+                            area_key)
+from trend_cube import DASH_PATH
+
+# -----------------------------------------------------
+# 1. SETTINGS
+# -----------------------------------------------------
+#
+# One DecisionTreeRegressor per area on the transaction-level data the
+# dashboard uses, with the notebook's settings: the inputs predict_with_area
+# takes, one-hot encoded per area like pd.get_dummies, meter_sale_price as
+# target, a seeded hold-out split for the validation error.
+
+TRAINING_PATH = DASH_PATH
+MANIFEST_PATH = os.path.join(MODELS_DIR, MANIFEST_NAME)
+
+NUMERIC_FEATURES = ["procedure_area", "has_parking", "swimming_pool", "balcony", "elevator", "metro"]
+CATEGORICAL_FEATURES = ["floor_bin", "rooms_en"]
+TARGET = "meter_sale_price"
+TREE_PARAMS = {"random_state": 42}
+VALIDATION_FRACTION = 0.2
+SPLIT_SEED = 42
+
+
+def _atomic_pickle(obj, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump(obj, file)
+        file.flush()
+        os.fsync(file.fileno())
+    return tmp_path
+
+
+def _sha256(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+# -----------------------------------------------------
+# 2. Shared Training Data
+# -----------------------------------------------------
+def prepare(df):
+    """Encodes every area into one float32 matrix, rows grouped by area.
+
+    Returns (X, y, columns, partitions) where partitions maps area key to
+    (area, start, stop, column indices); the column subset is exactly what
+    pd.get_dummies gives on that area's rows alone.
+    """
+    df = df.dropna(subset=["area_name_en", TARGET] + NUMERIC_FEATURES + CATEGORICAL_FEATURES)
+    df = df.assign(_key=df["area_name_en"].map(area_key)).sort_values("_key", kind="stable")
+    dummies = pd.get_dummies(df[CATEGORICAL_FEATURES].astype(str), dtype=np.float32)
+    X = np.ascontiguousarray(np.hstack([df[NUMERIC_FEATURES].to_numpy(dtype=np.float32),
+                                        dummies.to_numpy(dtype=np.float32)]))
+    y = df[TARGET].to_numpy(dtype=np.float64)
+    columns = NUMERIC_FEATURES + list(dummies.columns)
+
+    keys = df["_key"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    stops = np.append(starts[1:], len(keys))
+    n_numeric = len(NUMERIC_FEATURES)
+    partitions = {}
+    for start, stop in zip(starts, stops):
+        present = np.flatnonzero(X[start:stop, n_numeric:].any(axis=0)) + n_numeric
+        used = np.concatenate([np.arange(n_numeric), present])
+        partitions[keys[start]] = (df["area_name_en"].iloc[start], int(start), int(stop), used)
+    return X, y, columns, partitions
+
+
+def partition_sha256(X, y, columns, start, stop, used):
+    # What the area's model is a function of: its rows, columns and the settings
+    digest = hashlib.sha256(json.dumps([[columns[i] for i in used], TREE_PARAMS,
+                                        VALIDATION_FRACTION, SPLIT_SEED]).encode())
+    digest.update(np.ascontiguousarray(X[start:stop][:, used]).tobytes())
+    digest.update(y[start:stop].tobytes())
+    return digest.hexdigest()
+
+
+def validation_split(n):
+    # (validation, training) positions within one area's n rows
+    order = np.random.default_rng(SPLIT_SEED).permutation(n)
+    n_val = int(round(n * VALIDATION_FRACTION)) if n > 1 else 0
+    return order[:n_val], order[n_val:]
+
+
+# -----------------------------------------------------
+# 3. Per-Area Fit (worker process)
+# -----------------------------------------------------
+def fit_area(task):
+    from sklearn.tree import DecisionTreeRegressor
+
+    area, X_path, y_path, start, stop, used, columns, model_path, columns_path = task
+    # Memory-mapped: every worker reads the parent's arrays, nothing is copied
+    X = np.load(X_path, mmap_mode="r")[start:stop][:, used]
+    y = np.load(y_path, mmap_mode="r")[start:stop]
+
+    val, train = validation_split(len(y))
+    n_val = len(val)
+
+    t = time.perf_counter()
+    model = DecisionTreeRegressor(**TREE_PARAMS).fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - t
+
+    result = {"area": area, "rows": int(stop - start), "train_rows": int(len(train)), "val_rows": int(n_val),
+              "columns": len(columns), "fit_seconds": fit_seconds, "nodes": int(model.tree_.node_count)}
+    if n_val:
+        error = model.predict(X[val]) - y[val]
+        result["val_mae"] = float(np.abs(error).mean())
+        result["val_rmse"] = float(np.sqrt((error ** 2).mean()))
+        result["val_mape"] = float(np.abs(error / y[val]).mean())
+
+    # Both files are complete on disk before either is swapped in, and the
+    # pair is swapped back to back. Until the manifest records the new pair's
+    # hashes, the registry will not serve the area from the pickles.
+    model_tmp = _atomic_pickle(model, model_path)
+    columns_tmp = _atomic_pickle(list(columns), columns_path)
+    os.replace(columns_tmp, columns_path)
+    os.replace(model_tmp, model_path)
+    result["model_sha256"] = _sha256(model_path)
+    result["columns_sha256"] = _sha256(columns_path)
+    return result
+
+
+# -----------------------------------------------------
+# 4. Pipeline
+# -----------------------------------------------------
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"areas": {}}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _unchanged(entry, digest, model_path, columns_path):
+    return (entry is not None and entry.get("partition_sha256") == digest
+            and os.path.exists(model_path) and os.path.exists(columns_path)
+            and entry.get("model_sha256") == _sha256(model_path)
+            and entry.get("columns_sha256") == _sha256(columns_path))
+
+
+def _write_manifest(manifest, path, trained, failed):
+    manifest["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    manifest["trained"] = sorted(trained)
+    manifest["failed"] = dict(sorted(failed.items()))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def train_all(df, models_dir=MODELS_DIR, trained_dir=TRAINED_DIR, manifest_path=None,
+              areas=None, workers=None, force=False, log=print):
+    """Fits every area whose training partition changed, in a process pool.
+
+    Returns the manifest: per area the partition digest, fit time,
+    validation error and the hashes of the written pickles. It is written
+    next to the models (where ModelRegistry checks them) unless
+    ``manifest_path`` says otherwise, and rewritten as each area finishes.
+    An area whose fit fails keeps its previous files and entry and is
+    listed under ``failed``.
+    """
+    manifest_path = manifest_path or os.path.join(models_dir, MANIFEST_NAME)
+    os.makedirs(models_dir, exist_ok=True)
+    os.makedirs(trained_dir, exist_ok=True)
+    X, y, columns, partitions = prepare(df)
+    if areas is not None:
+        wanted = {area_key(area) for area in areas}
+        partitions = {key: part for key, part in partitions.items() if key in wanted}
+
+    # Existing files keep their names ("Me_Aisem First" for "Me'Aisem First")
+    index = ModelRegistry(models_dir, trained_dir, compiled_dir=None, bundle_path=None).index
+    manifest = load_manifest(manifest_path)
+
+    tasks, digests = [], {}
+    trained, failed = [], {}
+    work_dir = tempfile.mkdtemp(prefix="train_models_")
+    try:
+        X_path, y_path = os.path.join(work_dir, "X.npy"), os.path.join(work_dir, "y.npy")
+        np.save(X_path, X)
+        np.save(y_path, y)
+        for key, (area, start, stop, used) in partitions.items():
+            filename = area.replace("'", "_")
+            default = (area, os.path.join(models_dir, f"{MODEL_PREFIX}{filename}.pkl"),
+                       os.path.join(trained_dir, f"{COLUMNS_PREFIX}{filename}.pkl"))
+            _, model_path, columns_path = index.get(key, default)
+            digests[key] = partition_sha256(X, y, columns, start, stop, used)
+            if not force and _unchanged(manifest["areas"].get(key), digests[key], model_path, columns_path):
+                log(f"   {area}: unchanged, skipped")
+                continue
+            tasks.append((area, X_path, y_path, start, stop, used, [columns[i] for i in used],
+                          model_path, columns_path))
+
+        # Largest areas first so the pool is not left waiting on one of them
+        tasks.sort(key=lambda task: task[3] - task[4])
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(fit_area, task): area_key(task[0]) for task in tasks}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed[key] = f"{type(e).__name__}: {e}"
+                        log(f"❌ {partitions[key][0]}: {failed[key]}")
+                        continue
+                    result["partition_sha256"] = digests[key]
+                    result["trained_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+                    manifest["areas"][key] = result
+                    trained.append(key)
+                    # The new pickles are already in place; until their hashes
+                    # are recorded the registry refuses to serve the area
+                    _write_manifest(manifest, manifest_path, trained, failed)
+                    log(f"✅ {result['area']}: {result['rows']} rows, {result['nodes']} nodes, "
+                        f"fit {result['fit_seconds']:.2f}s, val MAE {result.get('val_mae', float('nan')):.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        _write_manifest(manifest, manifest_path, trained, failed)
+    return manifest
+
+
+def rebuild_serving_artifacts(compact=False):
+    # The bundle and price cube are keyed on the pickles, so they go stale
+    # after a retrain; rebuild both from the new files
+    from compact_models import compact_tree
+    from model_bundle import build_bundle
+    from price_cube import build_price_cube
+
+    build_bundle(ModelRegistry(bundle_path=None, compiled_dir=None).index,
+                 transform=compact_tree if compact else None)
+    build_price_cube(ModelRegistry()).save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain the per-area decision trees in parallel.")
+    parser.add_argument("--data", default=TRAINING_PATH, help="transactions CSV or Parquet")
+    parser.add_argument("--areas", nargs="*", help="only these areas (default: every area in the data)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="refit areas whose partition did not change")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the model bundle and price cube afterwards")
+    parser.add_argument("--compact", action="store_true", help="with --rebuild, compact the bundled trees "
+                                                               "(see compact_models.py)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = pd.read_parquet(args.data) if args.data.endswith(".parquet") else pd.read_csv(args.data)
+    manifest = train_all(data, areas=args.areas, workers=args.workers, force=args.force)
+    if args.rebuild and manifest["trained"]:
+        rebuild_serving_artifacts(compact=args.compact)
+        print("✅ Rebuilt the model bundle and price cube")
+    print(f"{len(manifest['trained'])} areas trained in {time.perf_counter() - start:.1f}s")
+    if manifest["failed"]:
+        print(f"❌ {len(manifest['failed'])} areas failed: {', '.join(manifest['failed'])}")
+        sys.exit(1)
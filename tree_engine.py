@@ -0,0 +1,170 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# -----------------------------------------------------
+# 1. DIRECTORIES
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPILED_DIR = os.path.join(BASE_DIR, "compiled_models")
+
+ARRAYS = ("feature", "threshold", "left", "right", "value")
+LEAF = -1
+
+
+# -----------------------------------------------------
+# 2. Flat Tree
+# -----------------------------------------------------
+class FlatTree:
+    """A fitted regression tree as five parallel node arrays.
+
+    ``left``/``right`` hold child node ids (-1 at leaves), ``feature`` and
+    ``threshold`` the split, ``value`` the leaf prediction. Evaluation walks
+    all rows one level at a time, so a batch costs ``max_depth`` vectorised
+    steps instead of one sklearn call per row.
+    """
+
+    __slots__ = ARRAYS
+
+    def __init__(self, feature, threshold, left, right, value):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+
+    @classmethod
+    def from_sklearn(cls, model):
+        tree = model.tree_
+        return cls(
+            feature=np.array(tree.feature, dtype=np.int64),
+            threshold=np.array(tree.threshold, dtype=np.float64),
+            left=np.array(tree.children_left, dtype=np.int64),
+            right=np.array(tree.children_right, dtype=np.int64),
+            value=np.array(tree.value[:, 0, 0], dtype=np.float64),
+        )
+
+    @property
+    def node_count(self):
+        return len(self.left)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def predict(self, X):
+        # sklearn casts inputs to float32 before comparing against thresholds;
+        # doing the same keeps predictions bit-identical.
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        node = np.zeros(n, dtype=np.intp)
+        active = np.arange(n) if self.left[0] != LEAF else np.arange(0)
+
+        while active.size:
+            current = node[active]
+            go_left = X[active, self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[self.left[current] != LEAF]
+
+        return self.value[node].astype(np.float64, copy=False)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        return cls(**{name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS})
+
+
+def compiled_path(area, compiled_dir=COMPILED_DIR):
+    return os.path.join(compiled_dir, area)
+
+
+# -----------------------------------------------------
+# 3. Export + Parity Check
+# -----------------------------------------------------
+def _parity_inputs(encoder, tree, n_random=2000, seed=0):
+    # Every column set on its own, random rows over every known category,
+    # and procedure_area placed on and around each of the tree's split points.
+    rng = np.random.default_rng(seed)
+    X = np.zeros((encoder.n_features + 1 + n_random, encoder.n_features))
+    X[1:encoder.n_features + 1] = np.eye(encoder.n_features)
+
+    random_rows = X[encoder.n_features + 1:]
+    for field, i in encoder.numeric.items():
+        if field == "procedure_area":
+            random_rows[:, i] = rng.uniform(0, 300, n_random).round(2)
+        else:
+            random_rows[:, i] = rng.integers(0, 2, n_random)
+    for index in encoder.categories.values():
+        if index:
+            cols = np.array(list(index.values()) + [-1])
+            pick = cols[rng.integers(0, len(cols), n_random)]
+            hit = pick >= 0
+            random_rows[np.flatnonzero(hit), pick[hit]] = 1.0
+
+    i = encoder.numeric.get("procedure_area")
+    if i is None:
+        return X
+    splits = np.unique(tree.threshold[(tree.left != LEAF) & (tree.feature == i)]).astype(np.float32)
+    edges = np.concatenate([splits, np.nextafter(splits, np.float32(-np.inf)), np.nextafter(splits, np.float32(np.inf))])
+    edge_rows = random_rows[rng.integers(0, n_random, len(edges))].copy()
+    edge_rows[:, i] = edges
+    return np.vstack([X, edge_rows])
+
+
+def export_all(registry, compiled_dir=COMPILED_DIR):
+    for area in registry.areas():
+        entry = registry.get(area)
+        FlatTree.from_sklearn(entry.model).save(compiled_path(entry.area, compiled_dir))
+        print(f"✅ {entry.area}: {entry.tree.node_count} nodes")
+
+
+def check_parity(entry):
+    # (rows, rows differing) between the tree the registry serves for an area
+    # and its sklearn pickle. Compacted trees store float32 leaf values (see
+    # compact_models.py), so sklearn's output is compared at that precision.
+    X = _parity_inputs(entry.encoder, entry.tree)
+    expected = entry.model.predict(X.astype(np.float32), check_input=False)
+    expected = expected.astype(entry.tree.value.dtype).astype(np.float64)
+    got = entry.tree.predict(X)
+    return len(X), int((expected.view(np.int64) != got.view(np.int64)).sum())
+
+
+def verify_all(registry):
+    failures = 0
+    for area in registry.areas():
+        entry = registry.get(area)
+        rows, differing = check_parity(entry)
+        if differing:
+            failures += 1
+            print(f"❌ {entry.area}: {differing} of {rows} rows differ")
+        else:
+            print(f"✅ {entry.area}: {rows} rows identical")
+    return failures
+
+
+if __name__ == "__main__":
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Export dt_models to flat .npy trees and check the served trees "
+                                                 "against sklearn.")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--out", default=COMPILED_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_all(ModelRegistry(compiled_dir=None, bundle_path=None), args.out)
+        registry = ModelRegistry(compiled_dir=args.out, bundle_path=None)
+    else:
+        # What the service serves: snapshot, bundle, compiled trees or pickles
+        from model_registry import get_registry
+
+        registry = get_registry()
+    sys.exit(1 if verify_all(registry) else 0)
@@ -0,0 +1,161 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import quantiles, sketch_groups
+
+# -----------------------------------------------------
+# 1. FILES
+# -----------------------------------------------------
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DASH_PATH = os.path.join(BASE_DIR, "Data_data_columns", "data_for_dash.csv")
+TREND_CUBE_PATH = os.path.join(BASE_DIR, "trend_cube.parquet")
+
+TREND_KEYS = ["area_name_en", "rooms_en", "floor_bin",
+              "has_parking", "swimming_pool", "balcony", "elevator", "metro"]
+FLAG_KEYS = TREND_KEYS[3:]
+CHUNK_ROWS = 500_000
+
+
+# -----------------------------------------------------
+# 2. Build
+# -----------------------------------------------------
+def _prepare(df):
+    df = df[TREND_KEYS + ["instance_date", "meter_sale_price"]].copy()
+    df["month"] = pd.to_datetime(df["instance_date"], errors="coerce").dt.to_period("M").dt.to_timestamp()
+    df = df.dropna(subset=["month", "meter_sale_price"] + TREND_KEYS)
+    for col in FLAG_KEYS:
+        df[col] = df[col].astype(np.int8)
+    return df
+
+
+def build_trend_table(chunks):
+    # One row per (8 filter attributes, month), sorted so every group is one
+    # contiguous run of rows. Transactions are streamed chunk by chunk into
+    # a KLL sketch per row, so memory is bounded by the number of groups,
+    # not transactions; the sketch is kept so later batches can be merged in.
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    sketches = {}
+    for chunk in chunks:
+        sketch_groups(_prepare(chunk), TREND_KEYS + ["month"], "meter_sale_price", sketches)
+
+    keys = sorted(sketches)
+    table = pd.DataFrame(keys, columns=TREND_KEYS + ["month"])
+    table["p10_price"], table["median_price"], table["p90_price"] = quantiles([sketches[key] for key in keys]).T
+    table["count"] = np.array([sketches[key].n for key in keys], dtype=np.int64)
+    table["sketch"] = [sketches[key].to_bytes() for key in keys]
+    for col in TREND_KEYS[:3]:
+        table[col] = table[col].astype(str).astype("category")
+    for col in FLAG_KEYS:
+        table[col] = table[col].astype(np.int8)
+    return table
+
+
+def build_trend_cube(dash_path=DASH_PATH, out=TREND_CUBE_PATH, chunksize=CHUNK_ROWS):
+    chunks = pd.read_csv(dash_path, usecols=TREND_KEYS + ["instance_date", "meter_sale_price"], chunksize=chunksize)
+    table = build_trend_table(chunks)
+    tmp_path = f"{out}.tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, out)
+    return TrendCube(table)
+
+
+# -----------------------------------------------------
+# 3. Lookup
+# -----------------------------------------------------
+class TrendCube:
+    """Monthly medians per filter combination of the Monthly Trend tabs.
+
+    ``trend(...)`` is a dict lookup plus one slice of the month, median and
+    count arrays instead of eight boolean masks over every transaction.
+    """
+
+    def __init__(self, table):
+        self.month = table["month"].to_numpy(dtype="datetime64[ns]")
+        self.median_price = table["median_price"].to_numpy(dtype=np.float64)
+        self.p10_price = table["p10_price"].to_numpy(dtype=np.float64)
+        self.p90_price = table["p90_price"].to_numpy(dtype=np.float64)
+        self.count = table["count"].to_numpy(dtype=np.int64)
+
+        keys = table[TREND_KEYS]
+        starts = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+        stops = np.append(starts[1:], len(table))
+        firsts = zip(*(keys[col].iloc[starts].tolist() for col in TREND_KEYS))
+        self.groups = {key: (int(start), int(stop)) for key, start, stop in zip(firsts, starts, stops)}
+
+    def __len__(self):
+        return len(self.groups)
+
+    @classmethod
+    def load(cls, path=TREND_CUBE_PATH):
+        # The sketches are only needed to rebuild, not to serve
+        return cls(pd.read_parquet(path, columns=TREND_KEYS + ["month", "median_price", "p10_price", "p90_price",
+                                                               "count"]))
+
+    def slice(self, area_name_en, rooms_en, floor_bin, has_parking, swimming_pool, balcony, elevator, metro):
+        key = (area_name_en, rooms_en, floor_bin,
+               int(has_parking), int(swimming_pool), int(balcony), int(elevator), int(metro))
+        start, stop = self.groups.get(key, (0, 0))
+        return pd.DataFrame({
+            "month": self.month[start:stop],
+            "median_price": self.median_price[start:stop],
+            "p10_price": self.p10_price[start:stop],
+            "p90_price": self.p90_price[start:stop],
+            "count": self.count[start:stop],
+        })
+
+    def trend(self, *selection):
+        # Month-start series like resample("MS").median(): months without
+        # sales are interpolated, leading gaps back-filled
+        df = self.slice(*selection)
+        if df.empty:
+            return df
+        months = pd.date_range(df["month"].iloc[0], df["month"].iloc[-1], freq="MS")
+        df = df.set_index("month").reindex(months).rename_axis("month")
+        df["count"] = df["count"].fillna(0).astype(np.int64)
+        for col in ["median_price", "p10_price", "p90_price"]:
+            df[col] = df[col].interpolate().bfill()
+        return df.reset_index()
+
+
+# -----------------------------------------------------
+# 4. Shared Instance
+# -----------------------------------------------------
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def _stale(path, source):
+    return not os.path.exists(path) or (
+        os.path.exists(source) and os.stat(source).st_mtime_ns > os.stat(path).st_mtime_ns)
+
+
+def get_trend_cube():
+    # Rebuilt from data_for_dash.csv when that file is newer than the cube
+    global _cube
+    if _cube is None:
+        with _cube_lock:
+            if _cube is None:
+                if _stale(TREND_CUBE_PATH, DASH_PATH):
+                    _cube = build_trend_cube()
+                else:
+                    _cube = TrendCube.load()
+    return _cube
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-aggregate data_for_dash.csv for the Monthly Trend tabs.")
+    parser.add_argument("--dash", default=DASH_PATH)
+    parser.add_argument("--out", default=TREND_CUBE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cube = build_trend_cube(args.dash, args.out)
+    print(f"✅ {len(cube)} filter combinations, {len(cube.month)} monthly rows, "
+          f"{os.path.getsize(args.out) / 1e6:.2f} MB, built in {time.perf_counter() - start:.1f}s")